@@ -28,6 +28,7 @@ def import_data(path):
     patterns = {
         'categories': 'parent*',
         'subcategories': 'sub*',
+        'tree': 'category_tree*',
         'items': 'items*',
     }
     # Import parent categories
@@ -36,7 +37,7 @@ def import_data(path):
     for categories in data_importer.get_data_from_multiple_files(
             patterns['categories']):
         try:
-            database_saver.save_categories_to_database(categories)
+            stats = database_saver.load_category_tree(categories)
         except Exception as e:
             db.session.rollback()
             click.echo(
@@ -44,6 +45,7 @@ def import_data(path):
                 .format(e)
             )
             sys.exit()
+        click.echo('Imported categories: {}'.format(stats.report()))
 
     # Import subcategories
     click.echo('Importing subcategories...')
@@ -53,7 +55,7 @@ def import_data(path):
         parent_categories = Category.query.filter(
             Category.is_parent()).all()
         try:
-            database_saver.save_subcategories_to_database(
+            stats = database_saver.save_subcategories_to_database(
                 subcategories,
                 parent_categories
             )
@@ -64,35 +66,52 @@ def import_data(path):
                 .format(e)
             )
             sys.exit()
+        click.echo('Imported subcategories: {}'.format(stats.report()))
+
+    # Import categories trees
+    click.echo('Importing categories trees...')
+
+    for categories in data_importer.get_data_from_multiple_files(
+            patterns['tree']):
+        try:
+            stats = database_saver.load_category_tree(categories)
+        except Exception as e:
+            db.session.rollback()
+            click.echo(
+                'Error occured while importing categories tree: {}'
+                .format(e)
+            )
+            sys.exit()
+        click.echo('Imported categories tree: {}'.format(stats.report()))
 
     # Import items
     click.echo('Importing items...')
 
-    for file_name in data_importer.get_files_names(patterns['items']):
-        # Get category's slug name from file's name
-        category_slug = re.search(
-            r'items_([a-zA-Z_]+)_',
-            file_name
-        ).group(1)
-        # Find category with found slug
-        items_category = Category.query.filter_by(
-            slug=category_slug).first()
-
-        if items_category:
-            click.echo('Importing items category: %s' % items_category.name)
-
-            items = data_importer.get_data_from_file(file_name)
-            try:
-                database_saver.save_items_to_database(
-                    items,
-                    items_category
-                )
-            except Exception as e:
-                db.session.rollback()
+    def iter_categories_items():
+        for file_name in data_importer.get_files_names(patterns['items']):
+            # Get category's slug name from file's name
+            category_slug = re.search(
+                r'items_([a-zA-Z_]+)_',
+                file_name
+            ).group(1)
+            # Find category with found slug
+            items_category = Category.query.filter_by(
+                slug=category_slug).first()
+
+            if items_category:
                 click.echo(
-                    'Error occured while importing items "{0}": {1}'
-                    .format(items_category, e)
-                )
-                sys.exit()
+                    'Importing items category: %s' % items_category.name)
+                yield (items_category.slug,
+                       data_importer.get_data_from_file(file_name))
+
+    # Items of all files are streamed to database in one transaction
+    try:
+        stats = database_saver.copy_items_to_database(
+            iter_categories_items())
+    except Exception as e:
+        db.session.rollback()
+        click.echo('Error occured while importing items: {}'.format(e))
+        sys.exit()
+    click.echo('Imported items: {}'.format(stats.report()))
 
     click.echo('Data import finished.')
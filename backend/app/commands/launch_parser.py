@@ -10,7 +10,7 @@ from . import cmd_bp
 @cmd_bp.cli.command()
 @click.option('-p', '--parse',
               type=click.Choice(
-                  ['categories', 'subcategories', 'items'],
+                  ['categories', 'subcategories', 'tree', 'items'],
                   case_sensitive=False
               ),
               help='Parser type.',
@@ -21,19 +21,67 @@ from . import cmd_bp
 @click.option('-s', '--save',
               is_flag=True,
               help='Save parsing result to database.')
-def launch_parser(parse, json, save):
+@click.option('--cache/--no-cache',
+              default=True,
+              help='Use on-disk cache for category pages.')
+@click.option('--parse-executor',
+              type=click.Choice(['inline', 'thread', 'process']),
+              help='Where to parse fetched pages, by default category '
+                   'pages are parsed inline and items\' pages in processes.')
+@click.option('--rate',
+              type=click.FloatRange(min=0.01),
+              help='Maximum number of requests per second to one host.')
+@click.option('--burst',
+              type=click.IntRange(min=1),
+              help='Number of requests to one host which may be made '
+                   'at once, before the rate applies.')
+@click.option('--headless/--no-headless',
+              default=True,
+              help='Run browsers for parsing items without window.')
+@click.option('-w', '--workers',
+              type=click.IntRange(min=1),
+              help='Number of browsers for parsing items.')
+@click.option('--engine',
+              type=click.Choice(['browser', 'state']),
+              default='browser',
+              help="Render items' pages in browser or read their state.")
+@click.option('--extract',
+              type=click.Choice(['html', 'script']),
+              default='html',
+              help='Parse page source or collect items in browser.')
+@click.option('--block-resources/--no-block-resources',
+              default=True,
+              help='Block images, media, fonts and third-party hosts '
+                   'in browsers.')
+@click.option('--warm-cache/--no-warm-cache',
+              default=False,
+              help='Share browser cache warmed up once by all browsers.')
+def launch_parser(parse, json, save, cache, parse_executor, rate, burst,
+                  headless, workers, engine, extract, block_resources,
+                  warm_cache):
     """Parse data from 'ozon.ru' and save result to db and .json file.
     """
     launcher = ParserLaucher(
         './parse_results',
         save_to_json=json,
         save_to_db=save,
+        use_cache=cache,
+        parse_executor=parse_executor,
+        requests_per_second=rate,
+        burst=burst,
+        headless=headless,
+        workers=workers,
+        items_engine=engine,
+        extract_mode=extract,
+        block_resources=block_resources,
+        warm_cache=warm_cache,
         session=db.session
     )
 
     launcher_functions = {
         'categories': launcher.fetch_parent_categories,
         'subcategories': launcher.fetch_subcategories,
+        'tree': launcher.fetch_category_tree,
         'items': launcher.fetch_items
     }
     try:
@@ -42,5 +90,7 @@ def launch_parser(parse, json, save):
         db.session.rollback()
         click.echo('Error occured while adding data: {}'.format(e))
         sys.exit()
+    finally:
+        launcher.close()
 
     click.echo('Parsing finished successfully.')
@@ -1,19 +1,217 @@
+import io
 import sys
 import os
+import csv
 import json
+import time
+from collections import deque
+from contextlib import nullcontext
 from datetime import datetime
 from urllib.parse import urlparse
 
-from app.models import Category, Item, Price
+from sqlalchemy import text
+
+from app.models import Category, Item, UpsertResult, upsert
 from app.parser import Parser
+from app.parser.tree_crawler import CategoryTreeCrawler
+
+
+class LoadStats:
+    """Count rows written by bulk loading, how many of them were
+    inserted, updated or left unchanged, and time it took.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def add(self, rows, result=None):
+        """Add number of rows written and UpsertResult of them if known.
+        """
+        self.rows += rows
+        if result is not None:
+            self.inserted += result.inserted
+            self.updated += result.updated
+            self.unchanged += result.unchanged
+
+    def merge(self, stats):
+        """Add rows counted by other LoadStats.
+        """
+        self.add(stats.rows, UpsertResult(
+            stats.inserted, stats.updated, stats.unchanged))
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def report(self):
+        return (
+            '{0} rows in {1:.2f} s, {2:.0f} rows/s: {3} inserted, '
+            '{4} updated, {5} unchanged'.format(
+                self.rows, self.seconds, self.rows_per_second,
+                self.inserted, self.updated, self.unchanged)
+        )
 
 
 class DatabaseSaver:
     """Class to interact with database."""
+    # Rows inserted with one multi-row INSERT statement
+    BATCH_SIZE = 1000
+    # Rows sent to database with one COPY, bounds memory taken by ingest
+    COPY_CHUNK_SIZE = 50000
+    # Items and their prices are copied to one staging table, then
+    # merged into tables with set-based statements
+    CREATE_ITEMS_STAGING_SQL = '''
+        CREATE TEMP TABLE items_staging (
+            number bigserial,
+            id integer,
+            name text,
+            url text,
+            image_url text,
+            category_slug text,
+            price integer
+        ) ON COMMIT DROP
+    '''
+    COPY_ITEMS_SQL = '''
+        COPY items_staging (id, name, url, image_url, category_slug, price)
+        FROM STDIN WITH (FORMAT csv)
+    '''
+    # The last row of item wins, like the last update of it would.
+    # Existing items are updated only if they changed, returns numbers
+    # of items inserted, updated and copied
+    MERGE_ITEMS_SQL = '''
+        WITH merged AS (
+            INSERT INTO items (id, name, url, image_url, category_slug)
+            SELECT DISTINCT ON (id) id, name, url, image_url, category_slug
+            FROM items_staging
+            ORDER BY id, number DESC
+            ON CONFLICT (id) DO UPDATE SET
+                name = excluded.name,
+                url = excluded.url,
+                image_url = excluded.image_url,
+                category_slug = excluded.category_slug
+            WHERE (items.name, items.url, items.image_url,
+                   items.category_slug)
+                IS DISTINCT FROM (excluded.name, excluded.url,
+                                  excluded.image_url, excluded.category_slug)
+            RETURNING xmax = 0 AS inserted
+        )
+        SELECT
+            (SELECT count(*) FROM merged WHERE inserted),
+            (SELECT count(*) FROM merged WHERE NOT inserted),
+            (SELECT count(DISTINCT id) FROM items_staging)
+    '''
+    # Price is written only if it differs from the last known price
+    # of item before today, item has one price per day: the last one
+    # of the day. Today's price changed back to that one is removed
+    SAVE_CHANGED_PRICES_SQL = '''
+        WITH changes AS (
+            SELECT new.item_id, new.value, last.value AS last_value
+            FROM ({new_prices}) AS new
+            LEFT JOIN LATERAL (
+                SELECT value FROM prices
+                WHERE prices.item_id = new.item_id
+                    AND prices.date < CURRENT_DATE
+                ORDER BY date DESC
+                LIMIT 1
+            ) AS last ON true
+        ), reverted AS (
+            DELETE FROM prices USING changes
+            WHERE prices.item_id = changes.item_id
+                AND prices.date = CURRENT_DATE
+                AND changes.value = changes.last_value
+        )
+        INSERT INTO prices (value, date, item_id)
+        SELECT value, CURRENT_DATE, item_id FROM changes
+        WHERE last_value IS DISTINCT FROM value
+        ON CONFLICT (item_id, date) DO UPDATE SET value = excluded.value
+        WHERE prices.value IS DISTINCT FROM excluded.value
+    '''
+    SAVE_PRICES_SQL = SAVE_CHANGED_PRICES_SQL.format(new_prices='''
+        SELECT * FROM unnest(
+            CAST(:item_ids AS integer[]), CAST(:values AS integer[])
+        ) AS new_prices (item_id, value)
+    ''')
+    MERGE_PRICES_SQL = SAVE_CHANGED_PRICES_SQL.format(new_prices='''
+        SELECT DISTINCT ON (staging.id) staging.id AS item_id,
+            staging.price AS value
+        FROM items_staging staging
+        JOIN items ON items.id = staging.id
+        ORDER BY staging.id, staging.number DESC
+    ''')
 
     def __init__(self, session):
         self.session = session
 
+    @staticmethod
+    def flatten_category_trees(trees):
+        """Get rows of categories and all their sections, parents
+        before children, from trees given as categories with their
+        parent Category or None. Slug and path of every category are
+        computed once, categories with urls already met are skipped.
+        """
+        rows = []
+        seen = set()
+        levels = deque(
+            (categories, parent.path if parent else None)
+            for categories, parent in trees
+        )
+        while levels:
+            level, parent_path = levels.popleft()
+            for category in level:
+                try:
+                    slug = Category.get_slug(category['url'])
+                except (AttributeError, TypeError):
+                    continue
+                if slug in seen or category['url'] in seen:
+                    continue
+                seen.update((slug, category['url']))
+
+                path = Category.get_path(slug, parent_path)
+                rows.append({
+                    'name': category['name'],
+                    'slug': slug,
+                    'url': category['url'],
+                    'path': path
+                })
+                sections = category.get('sections')
+                if sections:
+                    levels.append((sections, path))
+        return rows
+
+    def load_category_tree(self, categories, parent=None):
+        """Save categories and all their sections in one transaction
+        with multi-row inserts, return LoadStats.
+        """
+        return self.load_category_trees([(categories, parent)])
+
+    def load_category_trees(self, trees):
+        """Save categories of all trees given as categories with their
+        parent Category or None in one transaction, return LoadStats.
+        """
+        stats = LoadStats()
+        rows = self.flatten_category_trees(trees)
+        try:
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                batch = rows[start:start + self.BATCH_SIZE]
+                # Category met again, e.g. with the same slug under
+                # another parent, keeps its saved path and url
+                stats.add(len(batch), upsert(
+                    self.session, Category, batch, update_columns=[]))
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        return stats.finish()
+
     def save_categories_to_database(self, categories, parent=None):
         """Save categories to database and children categories if
         exists.
@@ -37,7 +235,11 @@ class DatabaseSaver:
             if sections:
                 children.append((sections, category_obj))
 
-        self.session.bulk_save_objects(category_objects)
+        upsert(self.session, Category, [
+            {'name': category_obj.name, 'slug': category_obj.slug,
+             'url': category_obj.url, 'path': category_obj.path}
+            for category_obj in category_objects
+        ], update_columns=[])
         self.session.commit()
         # Save children categories
         for section_objs, parent_section_obj in children:
@@ -48,45 +250,163 @@ class DatabaseSaver:
 
     def save_subcategories_to_database(
             self, all_subcategories, parent_categories):
-        """Save subcategories corresponds to parent categories.
+        """Save subcategories corresponds to parent categories
+        in one transaction, return LoadStats.
         """
-        for category in parent_categories:
-            subcategories = all_subcategories[category.url]
-            self.save_categories_to_database(subcategories, category)
+        return self.load_category_trees([
+            (all_subcategories[category.url], category)
+            for category in parent_categories
+        ])
 
     def save_items_to_database(self, items, category):
         """Save items to database that corresponds to given
-        category.
+        category, return UpsertResult of items.
         """
-        items_objects = []
+        items_rows = []
         prices = []
         for item in items:
-            # Create item object
-            item_obj = Item(
-                name=item['name'],
-                url=item['external_url'],
-                image_url=item['image_url'],
-                category_slug=category.slug
+            try:
+                item_id = int(Item.get_id(item['external_url']))
+            except (AttributeError, TypeError):
+                continue
+            items_rows.append(
+                {
+                    'id': item_id,
+                    'name': item['name'],
+                    'url': item['external_url'],
+                    'image_url': item['image_url'],
+                    'category_slug': category.slug
+                }
             )
-            items_objects.append(item_obj)
             # Add price dict for further insering to database
             prices.append(
                 {
                     'value': item['price'],
-                    'item_id': item_obj.id
+                    'item_id': item_id
                 }
             )
-        self.session.bulk_save_objects(items_objects)
+        result = upsert(self.session, Item, items_rows)
         self.session.commit()
 
         # SAVE PRICES
         self.save_prices_to_database(prices)
+        return result
 
     def save_prices_to_database(self, prices):
-        """Save prices to database.
+        """Save prices which changed since the last known ones to
+        database, return number of prices written.
         """
-        self.session.bulk_insert_mappings(Price, prices)
+        # Item gets one price per day, the last one wins
+        values = {price['item_id']: price['value'] for price in prices}
+        if not values:
+            return 0
+        result = self.session.execute(
+            text(self.SAVE_PRICES_SQL),
+            {'item_ids': list(values), 'values': list(values.values())}
+        )
         self.session.commit()
+        return result.rowcount
+
+    def iter_items_chunks(self, categories_items):
+        """Yield csv files of COPY_CHUNK_SIZE items' rows at most and
+        number of rows in them. Items with urls of no item are skipped.
+        """
+        chunk = io.StringIO()
+        writer = csv.writer(chunk)
+        rows = 0
+        for category_slug, items in categories_items:
+            for item in items:
+                try:
+                    item_id = Item.get_id(item['external_url'])
+                except (AttributeError, TypeError):
+                    continue
+                writer.writerow((
+                    item_id,
+                    item['name'],
+                    item['external_url'],
+                    item['image_url'],
+                    category_slug,
+                    item['price']
+                ))
+                rows += 1
+                if rows == self.COPY_CHUNK_SIZE:
+                    chunk.seek(0)
+                    yield chunk, rows
+                    chunk = io.StringIO()
+                    writer = csv.writer(chunk)
+                    rows = 0
+        if rows:
+            chunk.seek(0)
+            yield chunk, rows
+
+    def copy_items_to_database(self, categories_items):
+        """Save items and their prices in one transaction: stream them
+        with COPY to staging table and merge it into tables.
+        categories_items yields pairs of category's slug and its items.
+        Return LoadStats.
+        """
+        stats = LoadStats()
+        cursor = self.session.connection().connection.cursor()
+        try:
+            cursor.execute(self.CREATE_ITEMS_STAGING_SQL)
+            for chunk, rows in self.iter_items_chunks(categories_items):
+                cursor.copy_expert(self.COPY_ITEMS_SQL, chunk)
+                stats.add(rows)
+            cursor.execute(self.MERGE_ITEMS_SQL)
+            inserted, updated, copied = cursor.fetchone()
+            stats.add(0, UpsertResult(
+                inserted, updated, copied - inserted - updated))
+            cursor.execute(self.MERGE_PRICES_SQL)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        finally:
+            cursor.close()
+        return stats.finish()
+
+
+class JsonFileWriter:
+    """Write list or dict to .json file by parts, so that data does not
+    have to be kept in memory until the end of parsing.
+    """
+
+    def __init__(self, file_path, as_dict=False):
+        self.file = open(file_path, 'w', encoding='utf-8')
+        self.as_dict = as_dict
+        self.is_empty = True
+        self.file.write('{' if as_dict else '[')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def dumps(self, data):
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def write_separator(self):
+        self.file.write('\n' if self.is_empty else ',\n')
+        self.is_empty = False
+
+    def write(self, value):
+        """Add value to list.
+        """
+        self.write_separator()
+        self.file.write(self.dumps(value))
+
+    def write_item(self, key, value):
+        """Add key and value to dict.
+        """
+        self.write_separator()
+        self.file.write('{0}: {1}'.format(self.dumps(key), self.dumps(value)))
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write('\n}' if self.as_dict else '\n]')
+        self.file.close()
 
 
 class JsonSaveMixin:
@@ -106,18 +426,26 @@ class JsonSaveMixin:
                 .format(path, e)
             )
 
-    def save_to_jsonfile(self, name, data, path='.'):
+    def get_jsonfile_path(self, name, path='.'):
         timestamp = self.get_timestamp()
         # If path was given, create directory
         if path != '.':
             self.create_directory(path)
+        return '{0}/{1}_{2}.json'.format(path, name, timestamp)
+
+    def save_to_jsonfile(self, name, data, path='.'):
         with open(
-            '{0}/{1}_{2}.json'.format(path, name, timestamp),
+            self.get_jsonfile_path(name, path),
             'w',
             encoding='utf-8'
         ) as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
 
+    def open_jsonfile(self, name, path='.', as_dict=False):
+        """Open .json file for saving data by parts.
+        """
+        return JsonFileWriter(self.get_jsonfile_path(name, path), as_dict)
+
 
 class DataImporter:
     """Class for search and interact with .json files saved earlier.
@@ -163,12 +491,29 @@ class ParserLaucher(JsonSaveMixin, UrlProcessMixin, DatabaseSaver):
     """Class to interact with Parser.
     """
     BASE_URL = 'https://www.ozon.ru'
+    CACHE_DIRECTORY = 'cache/http'
+    BROWSER_CACHE_DIRECTORY = 'cache/browser'
+    # Number of pages of every category from previous runs
+    PAGE_COUNTS_FILE = 'page_counts.json'
+    # Parsed items are saved to database by batches of at least this
+    # number of items with one COPY
+    DB_BATCH_SIZE = 10000
 
     def __init__(
         self,
         result_save_directory,
         save_to_json=False,
         save_to_db=False,
+        use_cache=True,
+        parse_executor=None,
+        requests_per_second=None,
+        burst=None,
+        headless=True,
+        workers=None,
+        items_engine='browser',
+        extract_mode=None,
+        block_resources=True,
+        warm_cache=False,
         *args,
         **kwargs
     ):
@@ -176,7 +521,47 @@ class ParserLaucher(JsonSaveMixin, UrlProcessMixin, DatabaseSaver):
         self.save_to_json = save_to_json
         self.save_to_db = save_to_db
         super().__init__(*args, **kwargs)
-        self.parser = Parser()
+        self.parser = Parser(
+            requests_per_second=requests_per_second,
+            burst=burst,
+            cache_dir=self.CACHE_DIRECTORY if use_cache else None,
+            parse_executor=parse_executor,
+            headless=headless,
+            workers=workers,
+            items_engine=items_engine,
+            extract_mode=extract_mode,
+            block_resources=block_resources,
+            warm_cache_dir=self.BROWSER_CACHE_DIRECTORY if warm_cache
+            else None
+        )
+
+    def close(self):
+        """Release parser's resources.
+        """
+        self.parser.close()
+
+    def print_cache_report(self):
+        if self.parser.cache is not None:
+            print('Response cache:', self.parser.cache.report(),
+                  file=sys.stdout)
+
+    def get_page_counts_path(self):
+        return os.path.join(self.result_save_directory, self.PAGE_COUNTS_FILE)
+
+    def load_page_counts(self):
+        """Load number of pages of categories saved by previous runs.
+        """
+        try:
+            with open(self.get_page_counts_path(), 'r',
+                      encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_page_counts(self, page_counts):
+        self.create_directory(self.result_save_directory)
+        with open(self.get_page_counts_path(), 'w', encoding='utf-8') as f:
+            json.dump(page_counts, f, indent=2, ensure_ascii=False)
 
     @staticmethod
     def get_parent_categories_from_db():
@@ -189,6 +574,7 @@ class ParserLaucher(JsonSaveMixin, UrlProcessMixin, DatabaseSaver):
         # Parse site for parent categories
         categories = self.parser.get_parent_categories(self.BASE_URL)
         categories = categories[0][self.BASE_URL]
+        self.print_cache_report()
 
         # SAVE TO .JSON FILE
         if self.save_to_json:
@@ -202,74 +588,149 @@ class ParserLaucher(JsonSaveMixin, UrlProcessMixin, DatabaseSaver):
         # SAVE TO DATABASE
         if self.save_to_db:
             print('Saving to database...', file=sys.stdout)
-            self.save_categories_to_database(categories)
+            stats = self.load_category_tree(categories)
+            print('Saved categories:', stats.report(), file=sys.stdout)
 
     def fetch_subcategories(self):
         print('Fetching subcategories...', file=sys.stdout)
         # Get parent categories
-        parent_categories = self.get_parent_categories_from_db()
-        full_urls = [
-            self.get_full_url(self.BASE_URL, parent_category.url)
-            for parent_category in parent_categories
-        ]
-        subcategories = self.parser.get_subcategories(full_urls)
+        parent_categories = {
+            parent_category.url: parent_category
+            for parent_category in self.get_parent_categories_from_db()
+        }
+        full_urls = (
+            self.get_full_url(self.BASE_URL, url)
+            for url in parent_categories
+        )
+        json_writer = self.open_jsonfile(
+            'subcategories',
+            self.result_save_directory,
+            as_dict=True
+        ) if self.save_to_json else nullcontext()
+
+        # Save every page's subcategories as soon as they are parsed
+        with json_writer:
+            for url, subcategories in self.parser.iter_subcategories(
+                    full_urls):
+                path = self.get_url_path(url)
+                print('Parsed category:', path, file=sys.stdout)
+
+                # SAVE TO .JSON FILE
+                if self.save_to_json:
+                    json_writer.write_item(path, subcategories)
+
+                # SAVE TO DATABASE
+                if self.save_to_db:
+                    self.load_category_tree(
+                        subcategories,
+                        parent_categories[path]
+                    )
+
+        self.print_cache_report()
 
-        merged_subcategories = {}
-        for subcategory in subcategories:
-            key = list(subcategory)[0]
-            value = subcategory[key]
-            merged_subcategories[self.get_url_path(key)] = value
+    def fetch_category_tree(self):
+        print('Fetching categories tree...', file=sys.stdout)
+        # Crawl parent categories and all their subcategories
+        categories = self.parser.get_category_tree(self.BASE_URL)
+        count, depth = CategoryTreeCrawler.count_categories(categories)
+        print('Found {0} categories, {1} levels deep'.format(count, depth),
+              file=sys.stdout)
+        self.print_cache_report()
 
         # SAVE TO .JSON FILE
         if self.save_to_json:
             print('Saving to .json file...', file=sys.stdout)
             self.save_to_jsonfile(
-                'subcategories',
-                merged_subcategories,
+                'category_tree',
+                categories,
                 self.result_save_directory
             )
 
         # SAVE TO DATABASE
         if self.save_to_db:
             print('Saving to database...', file=sys.stdout)
-            self.save_subcategories_to_database(
-                merged_subcategories,
-                parent_categories
-            )
-
-    def fetch_items(self):
-        print('Fetching items...', file=sys.stdout)
-        # Get parent categories
-        parent_categories = self.get_parent_categories_from_db()
+            stats = self.load_category_tree(categories)
+            print('Saved categories:', stats.report(), file=sys.stdout)
 
-        for parent_category in parent_categories:
-            # For every parent category get its leaves categories
-            leaf_categories = Category.query.filter(
+    def get_leaf_categories_from_db(self):
+        """Load leaf categories of every parent category.
+        """
+        for parent_category in self.get_parent_categories_from_db():
+            yield from Category.query.filter(
                 Category.has_no_children(),
                 Category.path.descendant_of(parent_category.path)
             ).all()
 
-            for leaf_category in leaf_categories:
-                # For every leaf category get corresponding items
-                print('Parsing category:', leaf_category.name,
-                      file=sys.stdout)
+    def fetch_items(self):
+        print('Fetching items...', file=sys.stdout)
+        page_counts = self.load_page_counts()
+        # Leaf categories by their full urls, parser tags items with them
+        leaf_categories = {
+            self.get_full_url(self.BASE_URL, category.url): category
+            for category in self.get_leaf_categories_from_db()
+        }
+        categories = [
+            (url, page_counts.get(category.url))
+            for url, category in leaf_categories.items()
+        ]
+        # .json files of categories being parsed, every file is opened
+        # with the first items of category and closed with its end
+        json_writers = {}
+        db_stats = LoadStats()
+        # Items of parsed pages waiting to be saved to database
+        db_batch = []
+        db_batch_size = 0
+        results = self.parser.iter_categories_items(categories)
 
-                url = self.get_full_url(
-                    self.BASE_URL,
-                    leaf_category.url
-                )
-                items = self.parser.get_items(url)
+        try:
+            # Pages of all categories are parsed by one pool, save
+            # every page's items as soon as they are parsed
+            for url, items in results:
+                leaf_category = leaf_categories[url]
+
+                if items is None:
+                    print('Parsed category:', leaf_category.name,
+                          file=sys.stdout)
+                    if url in json_writers:
+                        json_writers.pop(url).close()
+                    # Remember number of pages for the next run
+                    page_count = self.parser.get_page_counts().get(url)
+                    if page_count:
+                        page_counts[leaf_category.url] = page_count
+                        self.save_page_counts(page_counts)
+                    continue
 
                 # SAVE ITEMS TO .JSON FILE
                 if self.save_to_json:
-                    print('Saving to .json file...', file=sys.stdout)
-                    self.save_to_jsonfile(
-                        'items_{}'.format(leaf_category.slug),
-                        items,
-                        self.result_save_directory
-                    )
+                    if url not in json_writers:
+                        json_writers[url] = self.open_jsonfile(
+                            'items_{}'.format(leaf_category.slug),
+                            self.result_save_directory
+                        )
+                    for item in items:
+                        json_writers[url].write(item)
 
                 # SAVE ITEMS TO DATABASE
                 if self.save_to_db:
-                    print('Saving to database...', file=sys.stdout)
-                    self.save_items_to_database(items, leaf_category)
+                    db_batch.append((leaf_category.slug, items))
+                    db_batch_size += len(items)
+                    if db_batch_size >= self.DB_BATCH_SIZE:
+                        db_stats.merge(self.copy_items_to_database(db_batch))
+                        db_batch = []
+                        db_batch_size = 0
+
+            if db_batch:
+                db_stats.merge(self.copy_items_to_database(db_batch))
+        finally:
+            # Stop parsing if saving failed or was interrupted
+            results.close()
+            for json_writer in json_writers.values():
+                json_writer.close()
+
+        print('Page timings:', self.parser.items_parser.timings.report(),
+              file=sys.stdout)
+        print('Page traffic:', self.parser.items_parser.traffic.report(),
+              file=sys.stdout)
+        if self.save_to_db:
+            print('Saved items:', db_stats.finish().report(),
+                  file=sys.stdout)
@@ -1,3 +1,5 @@
+import datetime
+
 import factory
 import factory.fuzzy
 
@@ -31,4 +33,7 @@ class PriceFactory(factory.alchemy.SQLAlchemyModelFactory):
         sqlalchemy_session = db.session
 
     id = factory.Sequence(lambda n: n)
+    # Item has one price per day
+    date = factory.Sequence(
+        lambda n: datetime.date.today() - datetime.timedelta(days=n))
     item_id = factory.SubFactory(ItemFactory)
@@ -1,10 +1,10 @@
 import re
 import datetime
+from collections import namedtuple
 
 from sqlalchemy.orm import remote, foreign, aliased
-from sqlalchemy.ext.compiler import compiles
-from sqlalchemy.sql import exists, and_
-from sqlalchemy.sql.expression import Insert
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import exists, and_, or_, literal_column
 from sqlalchemy_utils import LtreeType, Ltree
 from marshmallow import fields
 from flask_marshmallow import Marshmallow
@@ -15,18 +15,55 @@ from app import db
 ma = Marshmallow()
 
 
-@compiles(Insert)
-def insert_ignore(insert_stmt, compiler, **kwargs):
-    '''Convert every SQL insert statement to insert_ignore:
+UpsertResult = namedtuple('UpsertResult', 'inserted updated unchanged')
+
+
+def upsert(session, model, rows, index_elements=None, update_columns=None):
+    '''Insert rows to model's table with one statement, rows conflicting
+    by index_elements (primary key by default) update existing ones only
+    if values of update_columns (all other given columns by default)
+    differ (empty update_columns leave existing rows as they are):
     INSERT INTO test (id, bar) VALUES (1, 'a')
-    becomes:
-    INSERT INTO test (id, bar) VALUES (1, 'a') ON CONFLICT(foo) DO NOTHING
+    ON CONFLICT (id) DO UPDATE SET bar = excluded.bar
+    WHERE test.bar IS DISTINCT FROM excluded.bar
+    RETURNING xmax = 0
+    Return UpsertResult with numbers of inserted, updated and unchanged rows.
     '''
-    insert = compiler.visit_insert(insert_stmt, **kwargs)
-    if 'RETURNING' not in insert:
-        ondup = 'ON CONFLICT DO NOTHING'
-        insert = ' '.join((insert, ondup))
-    return insert
+    table = model.__table__
+    if index_elements is None:
+        index_elements = [column.name for column in table.primary_key]
+    # Statement can not affect the same row twice, the last row wins
+    rows = list({
+        tuple(row[name] for name in index_elements): row for row in rows
+    }.values())
+    if not rows:
+        return UpsertResult(0, 0, 0)
+    if update_columns is None:
+        update_columns = [
+            name for name in rows[0] if name not in index_elements]
+
+    statement = insert(table).values(rows)
+    excluded = statement.excluded
+    if update_columns:
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={name: excluded[name] for name in update_columns},
+            where=or_(*(
+                table.c[name].is_distinct_from(excluded[name])
+                for name in update_columns
+            ))
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(
+            index_elements=index_elements)
+    # xmax of inserted rows is 0, updated ones keep id of transaction
+    statement = statement.returning(
+        literal_column('xmax = 0').label('inserted'))
+
+    changed = session.execute(statement).fetchall()
+    inserted = sum(1 for row in changed if row.inserted)
+    return UpsertResult(
+        inserted, len(changed) - inserted, len(rows) - len(changed))
 
 
 # MODELS
@@ -52,17 +89,26 @@ class Category(db.Model):
 
     def __init__(self, *args, **kwargs):
         if 'slug' not in kwargs:
-            url = kwargs.get('url')
-            slug = re.search(r'/category/(\D+)-\d+', url).group(1)
-            slug = slug.replace('-', '_')
-            kwargs['slug'] = slug
-        else:
-            slug = kwargs.get('slug')
-        ltree_slug = Ltree(slug)
+            kwargs['slug'] = self.get_slug(kwargs.get('url'))
         parent = kwargs.get('parent')
-        kwargs['path'] = ltree_slug if not parent else parent.path + ltree_slug
+        kwargs['path'] = self.get_path(
+            kwargs['slug'], parent.path if parent else None)
         super().__init__(*args, **kwargs)
 
+    @staticmethod
+    def get_slug(url):
+        '''Get slug from category's url:
+        /category/cat-two-256121 becomes cat_two.
+        Raise AttributeError if url is not category's one.
+        '''
+        slug = re.search(r'/category/(\D+)-\d+', url).group(1)
+        return slug.replace('-', '_')
+
+    @staticmethod
+    def get_path(slug, parent_path=None):
+        ltree_slug = Ltree(slug)
+        return ltree_slug if parent_path is None else parent_path + ltree_slug
+
     @classmethod
     def is_parent(cls):
         return db.func.nlevel(cls.path) == 1
@@ -94,13 +140,21 @@ class Item(db.Model):
     )
     prices = db.relationship('Price', backref='item', lazy=True)
 
+    ID_PATTERN = re.compile(r'^\/.+[\/-](\d+)\/$')
+
     def __init__(self, *args, **kwargs):
         if 'id' not in kwargs:
-            url = kwargs.get('url')
-            id = re.search(r'^\/.+[\/-](\d+)\/$', url).group(1)
-            kwargs['id'] = id
+            kwargs['id'] = self.get_id(kwargs.get('url'))
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def get_id(cls, url):
+        '''Get id from item's url:
+        /context/detail/id/21131/ becomes '21131'.
+        Raise AttributeError if url is not item's one.
+        '''
+        return cls.ID_PATTERN.search(url).group(1)
+
     def __repr__(self):
         return '<Item %r>' % self.name
 
@@ -120,6 +174,10 @@ class Price(db.Model):
         nullable=False
     )
 
+    __table_args__ = (
+        db.UniqueConstraint(item_id, date, name='uq_prices_item_id_date'),
+    )
+
     def __repr__(self):
         return '<Price %r>' % self.value
 
@@ -1,26 +1,107 @@
 import os
 import logging
-from typing import List, Dict
+import multiprocessing
+from typing import List, Dict, Tuple, Iterable, Generator, Optional
 
+from .browser_profile import BrowserProfile
+from .cache import ResponseCache
 from .category_parser import CategoryParser, SubcategoryParser
 from .items_parser import ItemsParser
+from .rate_limiter import RateLimiter
+from .runtime import ParserRuntime
+from .state_items_parser import StateItemsParser
+from .tree_crawler import CategoryTreeCrawler
+from .warm_cache import WarmProfileCache
 
 
 log_filename = 'logs/parser.log'
-os.makedirs(os.path.dirname(log_filename), exist_ok=True)
 
-logging.basicConfig(
-    filename=log_filename,
-    filemode='w',
-    level=logging.DEBUG
-)
+# Parsing processes import parser too, they must not truncate the log
+if multiprocessing.current_process().name == 'MainProcess':
+    os.makedirs(os.path.dirname(log_filename), exist_ok=True)
+
+    logging.basicConfig(
+        filename=log_filename,
+        filemode='w',
+        level=logging.DEBUG
+    )
 
 
 class Parser:
-    def __init__(self) -> None:
-        self.category_parser = CategoryParser()
-        self.subcategory_parser = SubcategoryParser()
-        self.items_parser = ItemsParser()
+    # 'browser' renders category pages in Selenium, 'state' reads items
+    # from pages' embedded state and renders only pages without it
+    ITEMS_ENGINES: Tuple[str, ...] = ('browser', 'state')
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
+        http2: bool = False,
+        cache_dir: Optional[str] = None,
+        parse_executor: Optional[str] = None,
+        headless: bool = True,
+        workers: Optional[int] = None,
+        items_engine: str = 'browser',
+        extract_mode: Optional[str] = None,
+        block_resources: bool = True,
+        warm_cache_dir: Optional[str] = None
+    ) -> None:
+        if items_engine not in self.ITEMS_ENGINES:
+            raise ValueError('Unknown items engine: {}'.format(items_engine))
+        self.items_engine = items_engine
+        # Parsers share limiter to keep overall request rate to each host
+        self.rate_limiter = RateLimiter(requests_per_second, burst)
+        # and runtime to reuse event loop and connections between calls
+        self.runtime = ParserRuntime(http2=http2)
+        # Category pages rarely change, so they are cached between runs
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        # Browsers of items parser start with clones of warmed up profile
+        self.warm_cache = WarmProfileCache(warm_cache_dir) \
+            if warm_cache_dir else None
+        self.category_parser = CategoryParser(
+            rate_limiter=self.rate_limiter,
+            runtime=self.runtime,
+            cache=self.cache,
+            parse_executor=parse_executor
+        )
+        self.subcategory_parser = SubcategoryParser(
+            rate_limiter=self.rate_limiter,
+            runtime=self.runtime,
+            cache=self.cache,
+            parse_executor=parse_executor
+        )
+        # Prices change often, so items' pages are never cached
+        self.state_items_parser = StateItemsParser(
+            rate_limiter=self.rate_limiter,
+            runtime=self.runtime,
+            parse_executor=parse_executor
+        )
+        self.items_parser = ItemsParser(
+            rate_limiter=self.rate_limiter,
+            headless=headless,
+            workers=workers,
+            extract_mode=extract_mode,
+            runtime=self.runtime,
+            parse_executor=parse_executor,
+            # Light profile blocks resources not needed for parsing
+            profile=BrowserProfile() if block_resources
+            else BrowserProfile.get_full_profile(),
+            # Static assets are downloaded once and shared by browsers
+            warm_cache=self.warm_cache
+        )
+
+    def __enter__(self) -> 'Parser':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release resources shared by parsers.
+        """
+        # Stop browsers' session before executors it parses pages with
+        self.items_parser.close()
+        self.runtime.close()
 
     def get_parent_categories(self, url: str) -> List[Dict]:
         return self.category_parser.get_categories(url)
@@ -28,5 +109,88 @@ class Parser:
     def get_subcategories(self, urls: List[str]) -> List[Dict]:
         return self.subcategory_parser.get_subcategories(urls)
 
-    def get_items(self, url: str) -> List[Dict]:
-        return self.items_parser.get_items(url)
+    def iter_parent_categories(
+        self,
+        url: str
+    ) -> Generator[Dict, None, None]:
+        """Yield parent categories one by one.
+        """
+        return self.category_parser.iter_categories(url)
+
+    def iter_subcategories(
+        self,
+        urls: Iterable[str]
+    ) -> Generator[Tuple[str, List[Dict]], None, None]:
+        """Yield url of every parent category's page with its
+        subcategories as soon as the page is parsed.
+        """
+        return self.subcategory_parser.iter_subcategories(urls)
+
+    def get_category_tree(
+        self,
+        url: str,
+        max_depth: Optional[int] = None
+    ) -> List[Dict]:
+        """Get parent categories from main page and crawl all their
+        subcategories in one run.
+        """
+        return self.runtime.run(self.crawl_category_tree(url, max_depth))
+
+    async def crawl_category_tree(
+        self,
+        url: str,
+        max_depth: Optional[int] = None
+    ) -> List[Dict]:
+        pages_content = await self.category_parser.get_pages_content([url])
+        parent_categories = pages_content[0][url] if pages_content else []
+
+        crawler = CategoryTreeCrawler(
+            self.subcategory_parser, url, max_depth)
+        return await crawler.crawl(parent_categories)
+
+    def get_items(
+        self,
+        url: str,
+        expected_pages: Optional[int] = None
+    ) -> List[Dict]:
+        if self.items_engine == 'browser':
+            return self.items_parser.get_items(url, expected_pages)
+        return [item for items in self.iter_items(url) for item in items]
+
+    def iter_items(
+        self,
+        url: str,
+        expected_pages: Optional[int] = None
+    ) -> Generator[List[Dict], None, None]:
+        """Yield items of every category's page as soon as it is parsed.
+        Browser engine queues expected number of pages at once, state
+        engine knows it from the first page.
+        """
+        if self.items_engine == 'browser':
+            return self.items_parser.iter_items(url, expected_pages)
+        return self.runtime.iterate(self.state_items_parser.iter_items(
+            url, fallback=self.items_parser.get_page_items))
+
+    def iter_categories_items(
+        self,
+        categories: Iterable[Tuple[str, Optional[int]]]
+    ) -> Generator[Tuple[str, Optional[List[Dict]]], None, None]:
+        """Yield category's url with items of every parsed page and with
+        None when category is finished. Categories are given as urls
+        with expected number of pages.
+
+        Browser engine parses pages of all categories by one pool
+        of browsers, state engine parses categories one by one.
+        """
+        if self.items_engine == 'browser':
+            yield from self.items_parser.iter_categories_items(categories)
+            return
+        for url, _ in categories:
+            for items in self.iter_items(url):
+                yield url, items
+            yield url, None
+
+    def get_page_counts(self) -> Dict[str, int]:
+        """Get number of pages of categories parsed by browser.
+        """
+        return self.items_parser.page_counts
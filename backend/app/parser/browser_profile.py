@@ -0,0 +1,178 @@
+import json
+import logging
+from threading import Lock
+from typing import Any, List, Dict, NamedTuple, Optional
+
+from selenium import webdriver  # type: ignore
+from selenium.common.exceptions import WebDriverException  # type: ignore
+
+
+class PageTraffic(NamedTuple):
+    """Requests made by browser while page was loaded.
+    """
+    requests: int = 0
+    blocked: int = 0
+    bytes: int = 0
+
+
+class BrowserProfile:
+    """Settings of Chrome started for crawling items.
+
+    Only text and urls of images are read from pages, so images,
+    media, fonts and requests to hosts out of allow-list are blocked:
+    images with content settings, the rest with DevTools' blocked urls
+    and host resolver rules. With report_traffic requests are counted
+    from performance log of browser.
+    """
+    IMAGE_EXTENSIONS: List[str] = [
+        'jpg', 'jpeg', 'png', 'gif', 'webp', 'avif', 'svg', 'ico']
+    MEDIA_EXTENSIONS: List[str] = ['mp4', 'webm', 'ogg', 'mp3', 'm3u8']
+    FONT_EXTENSIONS: List[str] = ['woff', 'woff2', 'ttf', 'otf', 'eot']
+    ALLOWED_DOMAINS: List[str] = ['ozon.ru', 'ozone.ru']
+
+    def __init__(
+        self,
+        block_images: bool = True,
+        block_media: bool = True,
+        block_fonts: bool = True,
+        block_third_party: bool = True,
+        allowed_domains: Optional[List[str]] = None,
+        report_traffic: bool = True
+    ) -> None:
+        self.block_images = block_images
+        self.block_media = block_media
+        self.block_fonts = block_fonts
+        self.block_third_party = block_third_party
+        self.allowed_domains = allowed_domains or self.ALLOWED_DOMAINS
+        self.report_traffic = report_traffic
+
+    @classmethod
+    def get_full_profile(cls) -> 'BrowserProfile':
+        """Get profile loading every resource like stock browser.
+        """
+        return cls(block_images=False, block_media=False,
+                   block_fonts=False, block_third_party=False,
+                   report_traffic=False)
+
+    def get_prefs(self) -> Dict[str, Any]:
+        prefs = {}
+        if self.block_images:
+            prefs['profile.managed_default_content_settings.images'] = 2
+        return prefs
+
+    def get_blocked_urls(self) -> List[str]:
+        """Get url patterns of resources blocked with DevTools.
+        """
+        extensions = []
+        if self.block_images:
+            extensions += self.IMAGE_EXTENSIONS
+        if self.block_media:
+            extensions += self.MEDIA_EXTENSIONS
+        if self.block_fonts:
+            extensions += self.FONT_EXTENSIONS
+        return ['*.{}*'.format(extension) for extension in extensions]
+
+    def get_host_resolver_rules(self) -> Optional[str]:
+        """Get rules making every host but allowed ones unresolvable.
+        """
+        if not self.block_third_party:
+            return None
+        excluded = []
+        for domain in self.allowed_domains:
+            excluded += ['EXCLUDE {}'.format(domain),
+                         'EXCLUDE *.{}'.format(domain)]
+        return ', '.join(['MAP * ~NOTFOUND'] + excluded)
+
+    def apply(self, options: webdriver.ChromeOptions) -> Dict[str, Any]:
+        """Add profile's settings to options, return capabilities
+        to start browser with.
+        """
+        prefs = self.get_prefs()
+        if prefs:
+            options.add_experimental_option('prefs', prefs)
+        rules = self.get_host_resolver_rules()
+        if rules:
+            options.add_argument('--host-resolver-rules={}'.format(rules))
+
+        capabilities = options.to_capabilities()
+        if self.report_traffic:
+            capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+        return capabilities
+
+    def setup(self, driver: webdriver) -> None:
+        """Set blocking rules available only through DevTools.
+        """
+        blocked_urls = self.get_blocked_urls()
+        if not blocked_urls:
+            return
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd(
+                'Network.setBlockedURLs', {'urls': blocked_urls})
+        except WebDriverException as e:
+            logging.warning('Unable to block resources: %s', e)
+
+    def read_traffic(self, driver: webdriver) -> Optional[PageTraffic]:
+        """Count requests logged by browser since previous reading.
+        """
+        if not self.report_traffic:
+            return None
+        try:
+            entries = driver.get_log('performance')
+        except WebDriverException as e:
+            logging.debug('Unable to read performance log: %s', e)
+            return None
+
+        requests, blocked, transferred = 0, 0, 0
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                requests += 1
+            elif method == 'Network.loadingFinished':
+                transferred += int(params.get('encodedDataLength', 0))
+            elif method == 'Network.loadingFailed' and (
+                    params.get('blockedReason')
+                    or params.get('errorText') == 'net::ERR_NAME_NOT_RESOLVED'
+            ):
+                blocked += 1
+        return PageTraffic(requests, blocked, transferred)
+
+
+class TrafficStats:
+    """Collect traffic of loaded pages. Thread safe.
+    """
+
+    def __init__(self) -> None:
+        self.pages = 0
+        self.total = PageTraffic()
+        self._lock = Lock()
+
+    def record(self, url: str, traffic: Optional[PageTraffic]) -> None:
+        if traffic is None:
+            return
+        logging.debug(
+            'Page %s traffic: %s requests, %s blocked, %.1f KB', url,
+            traffic.requests, traffic.blocked, traffic.bytes / 1024)
+        with self._lock:
+            self.pages += 1
+            self.total = PageTraffic(*(
+                total + value for total, value in zip(self.total, traffic)))
+
+    def report(self) -> str:
+        with self._lock:
+            if not self.pages:
+                return 'no traffic recorded'
+            return (
+                '{0} pages, per page: {1:.0f} requests, {2:.0f} blocked, '
+                '{3:.1f} KB transferred'.format(
+                    self.pages,
+                    self.total.requests / self.pages,
+                    self.total.blocked / self.pages,
+                    self.total.bytes / self.pages / 1024
+                )
+            )
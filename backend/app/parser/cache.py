@@ -0,0 +1,159 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Tuple, Optional, NamedTuple
+
+
+class CacheEntry(NamedTuple):
+    """Cached response's body with its validators.
+    """
+    url: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def get_conditional_headers(self) -> Dict[str, str]:
+        """Get headers for revalidating entry with conditional request.
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """On-disk cache of responses' bodies. Entries are stored compressed
+    in files named by hash of url. Fresh entries are returned without
+    request, stale ones are revalidated with conditional request.
+    When cache grows over max_size, least recently used entries
+    are evicted.
+    """
+    DIRECTORY: str = 'cache/http'
+    TTL: float = 12 * 60 * 60
+    MAX_SIZE: int = 512 * 1024 * 1024
+    SUFFIX: str = '.json.gz'
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_size: Optional[int] = None
+    ) -> None:
+        self.directory = Path(directory or self.DIRECTORY)
+        self.ttl = self.TTL if ttl is None else ttl
+        self.max_size = max_size or self.MAX_SIZE
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(path.stat().st_size for path in self.get_paths())
+        self.stats: Dict[str, int] = {
+            'hits': 0,
+            'stale': 0,
+            'revalidated': 0,
+            'misses': 0,
+            'evicted': 0
+        }
+
+    def get_paths(self):
+        return self.directory.glob('*{}'.format(self.SUFFIX))
+
+    def get_path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.directory / '{0}{1}'.format(key, self.SUFFIX)
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Load entry for url, return None if it is not cached.
+        """
+        path = self.get_path(url)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = CacheEntry(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logging.debug('Dropping broken cache entry %s: %s', url, e)
+            self.remove(path)
+            return None
+        # Update modification time to mark entry as recently used
+        os.utime(path)
+        return entry
+
+    def lookup(self, url: str) -> Tuple[Optional[CacheEntry], bool]:
+        """Load entry for url and tell whether it may be used
+        without revalidation.
+        """
+        entry = self.get(url)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None, False
+        if entry.is_fresh(self.ttl):
+            self.stats['hits'] += 1
+            return entry, True
+        self.stats['stale'] += 1
+        return entry, False
+
+    def put(
+        self,
+        url: str,
+        text: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None
+    ) -> CacheEntry:
+        """Store downloaded response's body for url.
+        """
+        return self.write(
+            CacheEntry(url, text, etag, last_modified, time.time()))
+
+    def revalidate(self, entry: CacheEntry) -> CacheEntry:
+        """Mark entry as fresh again after server confirmed
+        it was not modified.
+        """
+        self.stats['revalidated'] += 1
+        return self.write(entry._replace(stored_at=time.time()))
+
+    def write(self, entry: CacheEntry) -> CacheEntry:
+        path = self.get_path(entry.url)
+        old_size = path.stat().st_size if path.exists() else 0
+
+        tmp_path = path.with_suffix('.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry._asdict(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self.size += path.stat().st_size - old_size
+        self.evict()
+        return entry
+
+    def remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        self.size -= size
+
+    def evict(self) -> None:
+        """Remove least recently used entries until cache fits max_size.
+        """
+        if self.size <= self.max_size:
+            return
+        paths = sorted(self.get_paths(), key=lambda p: p.stat().st_mtime)
+        for path in paths:
+            if self.size <= self.max_size:
+                break
+            self.remove(path)
+            self.stats['evicted'] += 1
+
+    def report(self) -> str:
+        return ', '.join(
+            '{0}: {1}'.format(name, value)
+            for name, value in self.stats.items()
+        )
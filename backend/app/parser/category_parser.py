@@ -1,87 +1,263 @@
-import re
 import json
 import asyncio
 import logging
 from urllib.parse import urlparse
 from abc import ABC, abstractmethod
-from typing import Tuple, List, Dict, AsyncGenerator
+from functools import partial
+from typing import (Any, Tuple, List, Dict, Iterable, AsyncIterable,
+                    AsyncGenerator, Awaitable, Callable, Generator,
+                    Optional, Union)
 
 import httpx
-from bs4 import BeautifulSoup  # type: ignore
 from fake_useragent import UserAgent  # type: ignore
 
+from .cache import ResponseCache
+from .extractor import DataStateExtractor
+from .rate_limiter import RateLimiter
+from .runtime import ParserRuntime
+from .retry import FetchResult, RetryBudget, RetryPolicy
+from .scheduler import bounded_as_completed
+
 
 class Fetcher:
     """Class to make asynchronous GET requests.
     """
-    KEEPALIVE_CONNECTIONS: int = 5
-    MAX_CONNECTIONS: int = 10
-    TIMEOUT: int = 10
+    # Maximum number of requests in flight at the same time
+    CONCURRENCY: int = ParserRuntime.MAX_CONNECTIONS
+    RETRY_POLICY: RetryPolicy = RetryPolicy()
+    # Stop downloading page as soon as extractor has found needed state
+    STREAM_UNTIL_FOUND: bool = False
 
-    def __init__(self):
+    def __init__(
+        self,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        runtime: Optional[ParserRuntime] = None,
+        cache: Optional[ResponseCache] = None
+    ) -> None:
         self.user_agent = UserAgent()
+        self.runtime = runtime or ParserRuntime()
+        self.cache = cache
+        self.retry_policy = retry_policy or self.RETRY_POLICY
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+    async def fetch(
+        self,
+        session: httpx.AsyncClient,
+        url: str,
+        budget: Optional[RetryBudget] = None
+    ) -> FetchResult:
+        """Make asynchronous GET request to url, repeat it according
+        to retry policy if failed. Never raises on failed request,
+        returns result with error instead.
+        Fresh responses are taken from cache if it is set,
+        stale ones are revalidated with conditional request.
+        """
+        cached = None
+        if self.cache is not None:
+            cached, is_fresh = self.cache.lookup(url)
+            if is_fresh:
+                return FetchResult(url, cached.text, attempts=0)
+
+        attempt = 0
+
+        while True:
+            attempt += 1
+            headers = {'User-Agent': self.user_agent.random}
+            if cached is not None:
+                headers.update(cached.get_conditional_headers())
+            retry_after = None
+            status_code = None
+            await self.rate_limiter.acquire_async(url)
+            try:
+                response, text = await self.request(session, url, headers)
+            except httpx.HTTPError as e:
+                error = '{0}: {1}'.format(type(e).__name__, e)
+                retryable = isinstance(e, httpx.TransportError)
+            else:
+                status_code = response.status_code
+                if status_code == 200:
+                    if self.cache is not None:
+                        self.cache.put(
+                            url,
+                            text,
+                            response.headers.get('ETag'),
+                            response.headers.get('Last-Modified')
+                        )
+                    return FetchResult(url, text, status_code,
+                                       attempts=attempt)
+                if status_code == 304 and cached is not None:
+                    cached = self.cache.revalidate(cached)  # type: ignore
+                    return FetchResult(url, cached.text, status_code,
+                                       attempts=attempt)
+                error = 'Status code {}'.format(status_code)
+                retryable = self.retry_policy.is_retryable_status(
+                    status_code)
+                retry_after = response.headers.get('Retry-After')
+
+            delay = self.retry_policy.get_delay(attempt, retry_after) \
+                if retryable else None
+            if delay is None or (budget is not None and not budget.spend()):
+                logging.debug('Failed while parsing %s after %s attempts: %s',
+                              url, attempt, error)
+                return FetchResult(url, status_code=status_code,
+                                   error=error, attempts=attempt)
+
+            logging.debug('Failed while parsing %s: %s, retrying in %.2fs',
+                          url, error, delay)
+            await asyncio.sleep(delay)
+
+    def get_extractor(self) -> Optional[DataStateExtractor]:
+        """Get extractor telling when enough of page is downloaded.
+        """
+        return None
 
-    async def fetch(self, session: httpx.AsyncClient,
-                    url: str) -> Tuple[str, httpx.Response]:
-        """Make asynchronous GET request to url.
+    async def request(
+        self,
+        session: httpx.AsyncClient,
+        url: str,
+        headers: Dict[str, str]
+    ) -> Tuple[httpx.Response, str]:
+        """Make GET request, return response and its text.
+        In streaming mode feed body's chunks to extractor and close
+        connection once it is done, returning only downloaded part.
         """
-        headers = {'User-Agent': self.user_agent.random}
-        try:
+        extractor = self.get_extractor() if self.STREAM_UNTIL_FOUND \
+            else None
+        if extractor is None:
             response = await session.get(url, headers=headers)
+            return response, response.text
+
+        async with session.stream('GET', url, headers=headers) as response:
             if response.status_code != 200:
-                response.raise_for_status()
-        except httpx.HTTPStatusError:
-            logging.debug('Failed while parsing %s: status code %s',
-                          url, response.status_code)
-        except httpx.HTTPError as e:
-            logging.debug('Failed while parsing %s: %s', url, e)
-        return url, response
+                await response.aread()
+                return response, response.text
+
+            chunks = []
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                if extractor.feed(chunk):
+                    logging.debug('Found state in %s after %s bytes',
+                                  url, sum(len(c) for c in chunks))
+                    break
+
+        # Body is read partly, so charset is taken from headers only
+        text = b''.join(chunks).decode(
+            response.charset_encoding or 'utf-8', errors='replace')
+        return response, text
 
     def get_session(self) -> httpx.AsyncClient:
         """Return client for making asynchronous requests.
         """
-        limits = httpx.Limits(
-            max_keepalive_connections=self.KEEPALIVE_CONNECTIONS,
-            max_connections=self.MAX_CONNECTIONS
-        )
-        session = httpx.AsyncClient(limits=limits, timeout=self.TIMEOUT)
-        return session
+        return self.runtime.get_session()
 
-    async def fetch_pages_content(self, urls: List[str]) -> AsyncGenerator:
-        """Asyncroniously fetch and page's html content from urls.
+    async def map_urls(
+        self,
+        function: Callable[..., Awaitable],
+        urls: Union[Iterable[str], AsyncIterable[str]]
+    ) -> AsyncGenerator:
+        """Call function(session, url, budget=budget) for every url.
+        Urls are taken lazily, no more than CONCURRENCY calls
+        are made at the same time, results are yielded as completed.
         """
-        tasks = []
         session = self.get_session()
+        budget = self.retry_policy.new_budget()
 
-        async with session:
-            for url in urls:
-                tasks.append(
-                    asyncio.create_task(
-                        self.fetch(session, url)
-                    ))
+        async for result in bounded_as_completed(
+            partial(function, session, budget=budget),
+            urls,
+            self.CONCURRENCY
+        ):
+            yield result
 
-            for task_result in asyncio.as_completed(tasks):
-                fetched_content = await task_result
-                url, response = fetched_content
-                yield url, response.text
+        if self.cache is not None:
+            logging.info('Response cache: %s', self.cache.report())
+
+    def __getstate__(self) -> Dict:
+        """Leave out shared resources when parser is sent
+        to another process.
+        """
+        state = self.__dict__.copy()
+        for name in ('user_agent', 'runtime', 'rate_limiter', 'cache'):
+            state.pop(name, None)
+        return state
 
 
 class ContentParser(Fetcher, ABC):
     """Class for parse page's html content.
     """
+    # Ids of widgets which 'data-state' holds page's content
+    PATTERNS: List[str] = []
+    STREAM_UNTIL_FOUND: bool = True
+    # Where to run parsing: 'inline', 'thread' or 'process'
+    PARSE_EXECUTOR: str = 'inline'
+
+    def __init__(
+        self,
+        *args,
+        parse_executor: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.parse_executor = parse_executor or self.PARSE_EXECUTOR
+
+    def get_extractor(self) -> DataStateExtractor:
+        return DataStateExtractor(self.PATTERNS)
+
+    async def parse_page(self, page_html: str):
+        """Parse page's html in configured executor, so that CPU-bound
+        parsing does not block requests made in event loop.
+        """
+        executor = self.runtime.get_executor(self.parse_executor)
+        if executor is None:
+            return self.parse(page_html)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.parse, page_html)
+
+    async def fetch_and_parse(
+        self,
+        session: httpx.AsyncClient,
+        url: str,
+        budget: Optional[RetryBudget] = None
+    ) -> Tuple[FetchResult, Any]:
+        """Fetch page and parse its content if request succeeded.
+        """
+        result = await self.fetch(session, url, budget)
+        if not result.ok:
+            return result, None
 
-    async def get_pages_content(self, urls: List[str]) -> List[Dict]:
+        logging.debug(
+            'Parsing url: %s',
+            url
+        )
+        page_content = await self.parse_page(result.text)
+        return result, page_content
+
+    async def iter_pages_content(
+        self,
+        urls: Union[Iterable[str], AsyncIterable[str]]
+    ) -> AsyncGenerator[Tuple[str, Any], None]:
+        """Asyncroniously get pages' html content and parse it,
+        yield url and content of every page as soon as it is parsed.
+        """
+        async for result, page_content in self.map_urls(
+                self.fetch_and_parse, urls):
+            if not result.ok:
+                logging.warning('Skipping url %s: %s',
+                                result.url, result.error)
+                continue
+
+            yield result.url, page_content
+
+    async def get_pages_content(
+        self,
+        urls: Union[Iterable[str], AsyncIterable[str]]
+    ) -> List[Dict]:
         """Asyncroniously get pages' html content and parse it.
         """
         pages_content = []
 
-        async for url, page_html in self.fetch_pages_content(urls):
-
-            logging.debug(
-                'Parsing url: %s',
-                url
-            )
-            page_content = self.parse(page_html)
+        async for url, page_content in self.iter_pages_content(urls):
             pages_content.append({url: page_content})
 
         return pages_content
@@ -97,6 +273,7 @@ class CategoryParser(ContentParser):
     """Class to get parent (from main page) categories' names and urls.
     """
     PATTERN: str = 'catalogMenu'
+    PATTERNS: List[str] = [PATTERN]
 
     def process_pattern(self, page_json: Dict) -> List[Dict[str, str]]:
         """Process dict of categories.
@@ -116,10 +293,10 @@ class CategoryParser(ContentParser):
         """Find and process tag with given pattern,
         return list of categories.
         """
-        soup = BeautifulSoup(page_html, 'lxml')
-
-        tag = soup.find(id=re.compile(self.PATTERN))
-        tag_content = tag['data-state']
+        states = self.get_extractor().extract(page_html)
+        if self.PATTERN not in states:
+            raise PatternNotFoundError(self.PATTERN)
+        tag_content = states[self.PATTERN]
 
         page_json = json.loads(tag_content)
         page_content = self.process_pattern(page_json)
@@ -127,9 +304,17 @@ class CategoryParser(ContentParser):
         return page_content
 
     def get_categories(self, url: str) -> List[Dict[str, str]]:
-        categories = asyncio.run(self.get_pages_content([url]))
+        categories = self.runtime.run(self.get_pages_content([url]))
         return categories
 
+    def iter_categories(
+        self,
+        url: str
+    ) -> Generator[Dict[str, str], None, None]:
+        for _, categories in self.runtime.iterate(
+                self.iter_pages_content([url])):
+            yield from categories
+
 
 class SubcategoryParser(ContentParser):
     """Class to get non-parent categories' names and urls.
@@ -198,18 +383,15 @@ class SubcategoryParser(ContentParser):
         """Find and process tag with given pattern,
         return list of categories.
         """
-        soup = BeautifulSoup(page_html, 'lxml')
-        # Trying to find out what pattern is using on page
-        # Сonsequentially check each pattern
-        # When pattern found, break
-        for pattern in self.PATTERNS:
-            tag = soup.find(id=re.compile(pattern))
-            if tag:
-                break
-        else:
+        # Find states of all patterns in one pass over html
+        # and take the first pattern found on page
+        extractor = self.get_extractor()
+        extractor.extract(page_html)
+        first_state = extractor.get_first_state()
+        if first_state is None:
             return []
 
-        tag_content = tag['data-state']
+        pattern, tag_content = first_state
         page_json = json.loads(tag_content)
 
         # Get function for processing depending on found pattern
@@ -224,9 +406,15 @@ class SubcategoryParser(ContentParser):
         return page_content
 
     def get_subcategories(self, urls: List[str]) -> List[Dict]:
-        subcategories = asyncio.run(self.get_pages_content(urls))
+        subcategories = self.runtime.run(self.get_pages_content(urls))
         return subcategories
 
+    def iter_subcategories(
+        self,
+        urls: Iterable[str]
+    ) -> Generator[Tuple[str, List[Dict]], None, None]:
+        yield from self.runtime.iterate(self.iter_pages_content(urls))
+
 
 class InvalidCategoryError(Exception):
     """Exception raised when invalid category passed.
@@ -234,6 +422,12 @@ class InvalidCategoryError(Exception):
     pass
 
 
+class PatternNotFoundError(Exception):
+    """Exception raised when page has no tag with expected pattern.
+    """
+    pass
+
+
 class Pattern(ABC):
     """Abstract class for objects that respresents patterns used
     for parsing subcategory pages.
@@ -272,11 +466,12 @@ class Pattern(ABC):
     def remove_query(url):
         return urlparse(url).path
 
-    def get_cleaned_url(self, url):
+    @classmethod
+    def get_cleaned_url(cls, url):
         """Clean url after extracting.
         """
-        url = self.remove_query(url)
-        return self.add_slash_to_end(url.strip())
+        url = cls.remove_query(url)
+        return cls.add_slash_to_end(url.strip())
 
     def filter_sections(self, sections):
         """Filter out section categories to avoid duplicates.
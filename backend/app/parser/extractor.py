@@ -0,0 +1,236 @@
+import re
+import codecs
+import html
+from typing import List, Dict, Tuple, Optional, Pattern, Union
+
+
+# Complete start tag: name followed by attributes with optional
+# quoted or unquoted values
+TAG_RE = re.compile(
+    r'''<[^\s/>]+(?:\s+[^\s"'>/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|'''
+    r'''[^\s"'=<>`]+))?|\s*/)*\s*/?>'''
+)
+# Quote starting attribute's value or end of tag
+TAG_END_RE = re.compile(r'''["'>]''')
+# End of script, which body may contain html in strings
+SCRIPT_END_RE = re.compile(r'</script\s*>', re.IGNORECASE)
+ATTRIBUTE_RE = re.compile(
+    r'''\s([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|'''
+    r'''([^\s"'=<>`]+)))?'''
+)
+
+
+class DataStateExtractor:
+    """Find tags which id contains one of patterns and get their
+    'data-state' attribute without building document tree.
+
+    Html is scanned in single pass and may be fed by chunks,
+    so the search can stop as soon as needed attribute is complete.
+    Patterns are listed by priority, like in the parsers: there is
+    no need to read further when the first pattern or every pattern
+    is found. With require_all extraction is done only when every
+    pattern is found.
+
+    While tag with found id is incomplete, next chunks are only scanned
+    for its end and kept apart, so long tags are read in linear time.
+    Bodies of scripts are skipped: ids met there are not tags' ones.
+    """
+    ATTRIBUTE: str = 'data-state'
+    # Number of characters kept between chunks to find id split by them
+    TAIL_SIZE: int = 1024
+    # Give up waiting for the end of tag after this number of characters
+    MAX_TAG_SIZE: int = 16 * 1024 * 1024
+
+    def __init__(
+        self,
+        patterns: List[str],
+        require_all: bool = False
+    ) -> None:
+        self.patterns = patterns
+        self.require_all = require_all
+        self.states: Dict[str, str] = {}
+        self._buffer = ''
+        self._position = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')(
+            errors='replace')
+        self._id_re = self.compile_id_re(patterns)
+        # Incomplete tag: its start, position scanned for its end up to
+        # and quote of attribute's value being scanned
+        self._tag_start: Optional[int] = None
+        self._tag_scanned = 0
+        self._tag_quote: Optional[str] = None
+        # Chunks received after buffer while waiting for the end of tag
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._in_script = False
+
+    @staticmethod
+    def compile_id_re(patterns: List[str]) -> Pattern:
+        """Compile expression finding start of script or id containing
+        one of patterns, the pattern is its second group.
+        """
+        return re.compile(
+            r'''(?i:(<script)\b)|\sid\s*=\s*["']?[^"'\s>]*?({})'''
+            .format('|'.join(re.escape(pattern) for pattern in patterns))
+        )
+
+    @property
+    def done(self) -> bool:
+        """Tell whether no more valuable state can be found.
+        """
+        if len(self.states) == len(self.patterns):
+            return True
+        return not self.require_all and self.patterns[0] in self.states
+
+    def feed(self, chunk: Union[str, bytes], final: bool = False) -> bool:
+        """Scan next chunk of html, return True when extraction is done.
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._decoder.decode(chunk, final)
+        if self._tag_start is not None:
+            offset = len(self._buffer) + self._pending_size
+            self._pending.append(chunk)
+            self._pending_size += len(chunk)
+            is_complete = self.find_tag_end(chunk, offset) is not None
+            is_too_long = offset + len(chunk) - self._tag_start \
+                >= self.MAX_TAG_SIZE
+            if not (is_complete or is_too_long or final):
+                return self.done
+            chunk = ''.join(self._pending)
+            self._pending = []
+            self._pending_size = 0
+        self._buffer += chunk
+
+        while len(self.states) < len(self.patterns):
+            if self._in_script:
+                match = SCRIPT_END_RE.search(self._buffer, self._position)
+                if match is None:
+                    self._position = max(
+                        self._position, len(self._buffer) - self.TAIL_SIZE)
+                    break
+                self._in_script = False
+                self._position = match.end()
+                continue
+
+            match = self._id_re.search(self._buffer, self._position)
+            if match is None:
+                self._position = max(
+                    self._position, len(self._buffer) - self.TAIL_SIZE)
+                break
+
+            # Start of script is searched for its tag like id is
+            tag = self.read_tag(match.start() + bool(match.group(1)), final)
+            if tag is None:
+                # Wait for the rest of tag in next chunks
+                self._position = match.start()
+                break
+
+            attributes, end = tag
+            pattern = match.group(2)
+            if match.group(1):
+                self._in_script = end > match.end()
+            elif pattern in attributes.get('id', '') \
+                    and self.ATTRIBUTE in attributes:
+                self.states.setdefault(pattern, attributes[self.ATTRIBUTE])
+                self.update_id_re()
+            self._position = max(end, match.end())
+
+        self.trim_buffer()
+        return self.done
+
+    def read_tag(
+        self,
+        id_position: int,
+        final: bool
+    ) -> Optional[Tuple[Dict[str, str], int]]:
+        """Get attributes and end of tag containing id at given position,
+        return None if the tag is not complete yet.
+        """
+        start = self._buffer.rfind('<', 0, id_position)
+        if start < 0:
+            # Not a tag, skip found id
+            return {}, id_position + 1
+        if start != self._tag_start:
+            self._tag_start = start
+            self._tag_scanned = start + 1
+            self._tag_quote = None
+
+        end = self.find_tag_end(self._buffer, 0)
+        if end is None:
+            incomplete = not final and \
+                len(self._buffer) - start < self.MAX_TAG_SIZE
+            if incomplete:
+                return None
+        self._tag_start = None
+        match = TAG_RE.match(self._buffer, start, end + 1) \
+            if end is not None else None
+        if match is None:
+            # Not a tag, skip found id
+            return {}, id_position + 1
+
+        attributes = {}
+        for name, double_quoted, single_quoted, unquoted in \
+                ATTRIBUTE_RE.findall(match.group()):
+            value = double_quoted or single_quoted or unquoted
+            attributes.setdefault(name.lower(), html.unescape(value))
+        return attributes, match.end()
+
+    def find_tag_end(self, text: str, offset: int) -> Optional[int]:
+        """Continue scanning incomplete tag for its end in text starting
+        at offset of buffer, return position of tag's end in buffer or
+        None if text does not contain it.
+        """
+        position = max(self._tag_scanned - offset, 0)
+        while True:
+            if self._tag_quote is not None:
+                position = text.find(self._tag_quote, position)
+                if position < 0:
+                    break
+                self._tag_quote = None
+                position += 1
+                continue
+            match = TAG_END_RE.search(text, position)
+            if match is None:
+                break
+            if match.group() == '>':
+                self._tag_scanned = offset + match.start()
+                return self._tag_scanned
+            self._tag_quote = match.group()
+            position = match.end()
+        self._tag_scanned = offset + len(text)
+        return None
+
+    def update_id_re(self) -> None:
+        """Search only for patterns not found yet.
+        """
+        remaining = [pattern for pattern in self.patterns
+                     if pattern not in self.states]
+        if remaining:
+            self._id_re = self.compile_id_re(remaining)
+
+    def trim_buffer(self) -> None:
+        """Drop scanned part of buffer keeping possible start of tag.
+        """
+        start = self._position if self._in_script \
+            else self._buffer.rfind('<', 0, self._position)
+        start = min(start, self._position - self.TAIL_SIZE)
+        if start > 0:
+            self._buffer = self._buffer[start:]
+            self._position -= start
+            if self._tag_start is not None:
+                self._tag_start -= start
+                self._tag_scanned -= start
+
+    def extract(self, page_html: Union[str, bytes]) -> Dict[str, str]:
+        """Get states for every pattern found in whole page.
+        """
+        self.feed(page_html, final=True)
+        return self.states
+
+    def get_first_state(self) -> Optional[Tuple[str, str]]:
+        """Get found state with the highest priority and its pattern.
+        """
+        for pattern in self.patterns:
+            if pattern in self.states:
+                return pattern, self.states[pattern]
+        return None
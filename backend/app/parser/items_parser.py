@@ -1,206 +1,551 @@
-import os
 import re
+import sys
 import time
 import logging
-from queue import PriorityQueue, Empty
-from threading import Thread, Lock, Event
+from queue import Queue, PriorityQueue
+from threading import Thread, Event, Lock, BoundedSemaphore
+from functools import partial
+from concurrent.futures import Future
 from pathlib import Path
 from urllib.parse import urlparse, ParseResult
-from contextvars import ContextVar
-from typing import Tuple, List, Dict, Union, Iterable, Generator
+from typing import (Tuple, List, Dict, Union, Iterable, Generator,
+                    Callable, NamedTuple, Optional)
 
 from selenium import webdriver  # type: ignore
 import bs4  # type: ignore
 from bs4 import BeautifulSoup  # type: ignore
 from fake_useragent import UserAgent  # type: ignore
 
+from .browser_profile import BrowserProfile, TrafficStats
+from .rate_limiter import RateLimiter
+from .runtime import ParserRuntime
+from .tile_extractor import TileExtractor
+from .warm_cache import WarmProfileCache
+from .webdriver_pool import WebDriverPool
+
+
+# Collect fields of product tiles and pagination links inside page,
+# following the same rules as ItemsParser.process_tags
+EXTRACT_TILES_SCRIPT = r"""
+var withHref = function (root, part) {
+    return Array.prototype.filter.call(
+        root.querySelectorAll('[href]'),
+        function (el) { return el.getAttribute('href').indexOf(part) >= 0; }
+    );
+};
+var tiles = [];
+document.querySelectorAll(arguments[0]).forEach(function (tile) {
+    var links = withHref(tile, 'context');
+    if (!links.length) {
+        links = withHref(tile, 'product');
+    }
+    if (links.length < 2) {
+        return;
+    }
+    var image = links[0].querySelector('img');
+    var name = '';
+    for (var i = 0; i < links.length; i++) {
+        var first = links[i].firstChild;
+        if (first && first.nodeType === Node.TEXT_NODE
+                && first.nodeValue === links[i].textContent) {
+            name = links[i].textContent;
+            break;
+        }
+    }
+    var price = links[1].querySelector('span')
+        || links[links.length - 1].querySelector('span');
+    tiles.push({
+        href: links[0].getAttribute('href'),
+        image_url: image ? image.getAttribute('src') : null,
+        name: name,
+        price: price ? price.textContent : null
+    });
+});
+var pages = Array.prototype.map.call(
+    document.querySelectorAll('[href]'),
+    function (el) { return el.getAttribute('href'); }
+).filter(function (href) { return /page=\d+$/.test(href); });
+return {tiles: tiles, pages: pages};
+"""
+
+# Count product tiles, -1 while results container is not rendered
+COUNT_TILES_SCRIPT = r"""
+if (!document.querySelector(arguments[0])) {
+    return -1;
+}
+return document.querySelectorAll(arguments[1]).length;
+"""
+
+# Check if page has pagination links, like ItemsParser.get_max_page_number
+HAS_PAGINATION_SCRIPT = r"""
+return Array.prototype.some.call(
+    document.querySelectorAll('[href]'),
+    function (el) { return /page=\d+$/.test(el.getAttribute('href')); }
+);
+"""
+
+# Task telling consumer to finish, sorted after every page
+SENTINEL: Tuple[int, int, None] = (sys.maxsize, 0, None)
+
+
+class CategoryPages:
+    """Page numbers of one category parsed by the pool. Thread safe.
+
+    Pages are added to the shared queue as (index, page_number, url)
+    as soon as maximum page number grows, so categories listed first
+    are parsed first. Category is finished when none of its pages is
+    queued or being parsed.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        url: str,
+        queue: PriorityQueue,
+        expected_pages: Optional[int] = None
+    ) -> None:
+        self.index = index
+        self.url = url
+        self.queue = queue
+        self.expected_pages = expected_pages
+        self.max_page_number: int = 0
+        self.current_page_number: int = 0
+        # Last page of listing once its end is found
+        self.last_page_number: Optional[int] = None
+        self.pending: int = 0
+        self._lock = Lock()
+
+    def start(self) -> None:
+        """Queue pages known before parsing: the first one or expected
+        number of pages from previous run.
+        """
+        self.update_max_page_number(self.expected_pages or 1)
+
+    def update_max_page_number(self, page_number: int) -> None:
+        with self._lock:
+            if page_number > self.max_page_number:
+                self.max_page_number = page_number
+                if self.last_page_number is not None:
+                    self.max_page_number = min(
+                        self.max_page_number, self.last_page_number)
+            self.enqueue_pages()
+
+    def enqueue_pages(self) -> None:
+        """Add pages up to maximum one, which are not queued yet,
+        to the queue. Called with lock held.
+        """
+        pages = range(self.current_page_number + 1, self.max_page_number + 1)
+        for page_number, url in ItemsParser.get_pages_urls(self.url, pages):
+            self.queue.put((self.index, page_number, url))
+        if pages:
+            logging.debug('Added %s tasks of %s to the queue',
+                          len(pages), self.url)
+            self.pending += len(pages)
+            self.current_page_number = self.max_page_number
+
+    def set_last_page_number(self, page_number: int) -> None:
+        """Mark page as the last one of listing, so pages after it
+        are not requested.
+        """
+        with self._lock:
+            if self.last_page_number is None \
+                    or page_number < self.last_page_number:
+                self.last_page_number = page_number
+            self.max_page_number = min(
+                self.max_page_number, self.last_page_number)
+
+    def update_lazy_page_number(
+        self,
+        page_number: int,
+        tiles_count: int,
+        is_listing_end: bool
+    ) -> None:
+        """Update maximum page number using page without pagination.
 
-var_driver = ContextVar('driver', default=None)
+        Empty page lies after the end of listing, fully scrolled page
+        is the last one, page left with scroll budget over is followed
+        by the next one.
+        """
+        if not tiles_count:
+            self.set_last_page_number(page_number - 1)
+        elif is_listing_end:
+            self.set_last_page_number(page_number)
+        else:
+            self.update_max_page_number(page_number + 1)
+
+    def finish_page(self) -> bool:
+        """Mark queued page as processed, return True if it was
+        the last page of category.
+        """
+        with self._lock:
+            self.pending -= 1
+            return self.pending == 0
 
 
 class ProducerThread(Thread):
-    """Custom thread class for getting urls from queue, parsing it
-    and updating items' list and maximum page number.
-    Check the queue for a task after a specified period of time.
+    """Custom thread class for starting parsing of categories and
+    stopping consumers when every page is parsed.
+
+    Pages are added to the queue as soon as maximum page number
+    of their category grows, so the queue runs out of tasks only when
+    no parsed page knows about more pages.
     """
 
     def __init__(
         self,
         queue: PriorityQueue,
-        event: Event,
         parser: 'ItemsParser',
-        url: str
+        categories: Iterable[Tuple[str, Optional[int]]],
+        consumers: int
     ) -> None:
         Thread.__init__(self)
         self.queue = queue
-        self.start_event = event
         self.parser = parser
-        self.url = url
+        self.categories = categories
+        self.consumers = consumers
 
     def run(self) -> None:
-        while True:
-            # Start and wait for event to start
-            if not self.start_event.is_set():
-                logging.debug('Producer: Waiting for start...')
-
-            self.start_event.wait()
-            logging.debug('Producer: Producing task to the queue')
-            # Get current and max page number
-            max_page_number = self.parser.max_page_number
-            current_page_number = self.parser.current_page_number
-
-            logging.debug('Producer: Current page: %s, max page: %s',
-                          current_page_number, max_page_number)
-            # If current page is equal to maximum page, stop
-            if current_page_number == max_page_number:
-                logging.debug('Producer: Finishing...')
-                break
-            # If not, add additional tasks to queue
-            i = 0
-            for page_number, url in self.parser.get_pages_urls(
-                self.url,
-                range(
-                    current_page_number + 1,
-                    max_page_number + 1
-                )
-            ):
-                i += 1
-                self.queue.put((page_number, url))
-            # Update current page number
-            logging.debug('Producer: Added %s tasks to the queue', i)
-            self.parser.update_current_page_number(max_page_number)
-            # Wait for tasks to complete
-            logging.debug('Producer: ')
+        logging.debug('Producer: Starting session...')
+        try:
+            for index, (url, expected_pages) in enumerate(self.categories):
+                if self.parser.stop_event.is_set():
+                    break
+                category = CategoryPages(
+                    index, url, self.queue, expected_pages)
+                # Register category before its pages reach consumers
+                self.parser.add_category(category)
+                category.start()
+            # Wait for every page including ones added while parsing
             self.queue.join()
+        finally:
+            logging.debug('Producer: Finishing...')
+            for _ in range(self.consumers):
+                self.queue.put(SENTINEL)
 
 
 class ConsumerThread(Thread):
     """Custom thread class for getting urls from queue, parsing it
     and updating items' list and maximum page number.
-    Ask the queue for a task after a specified period of time.
+    Blocks on the queue until a task or sentinel comes. Once session
+    is stopped, remaining tasks are taken without loading pages.
     """
 
     def __init__(
         self,
         queue: PriorityQueue,
-        event: Event,
-        parser: 'ItemsParser',
-        check_period: int = 1
+        parser: 'ItemsParser'
     ) -> None:
         Thread.__init__(self)
         self.queue = queue
-        self.terminate_event = event
         self.parser = parser
-        self.check_period = check_period
 
     def run(self) -> None:
         while True:
-            # If terminate event is set, stop
-            if self.terminate_event.is_set():
-                logging.debug(
-                    'Consumer %s: Terminate event is set. Finishing...',
-                    self.name
-                )
+            index, page_number, url = self.queue.get()
+            if url is None:
+                logging.debug('Consumer %s: Finishing...', self.name)
+                self.queue.task_done()
                 break
-            # Ask queue for task
+
+            category = self.parser.categories[index]
+            # Skip pages of stopped session and pages found to be
+            # after the end of listing
+            if self.parser.stop_event.is_set() \
+                    or page_number > category.max_page_number:
+                logging.debug('Consumer %s: Skipping %s', self.name, url)
+                self.finish_task(category)
+                continue
+
+            logging.debug('Consumer %s: Got item from queue: %s',
+                          self.name, url)
+            # Load url got from queue, page is parsed apart from
+            # browser and task is done when its items are ready
             try:
-                logging.debug('Consumer %s: Request item from queue',
-                              self.name)
-                queue_item = self.queue.get(block=False)
-            # If it is empty wait
-            except Empty:
-                logging.debug('Consumer %s: Queue is empty, waiting...',
-                              self.name)
-                time.sleep(self.check_period)
-            else:
-                _, url = queue_item
-                logging.debug('Consumer %s: Got item from queue^ %s',
-                              self.name, url)
-                # Parse url got from queue
-                try:
-                    items = self.parser.get_page_items(url)
-                except Exception as e:
-                    logging.debug(
-                        'Consumer %s: Error occured while parsing %s: %s',
-                        self.name, url, e
-                    )
-                    self.queue.task_done()
-                    break
-                # Refresh the general list of items with items
-                # retrieved from the parsed URL
-                self.parser.update_items(items)
+                self.parser.process_page(
+                    url, category, partial(self.finish_task, category))
+            except Exception as e:
+                logging.warning(
+                    'Consumer %s: Error occured while loading %s: %s',
+                    self.name, url, e
+                )
+                self.finish_task(category)
 
-                logging.debug('Consumer %s: Task Done: processed %s',
-                              self.name, url)
-                # Signal queue task is done
-                self.queue.task_done()
+    def finish_task(self, category: CategoryPages) -> None:
+        if category.finish_page():
+            self.parser.finish_category(category)
+        # Signal queue task is done
+        self.queue.task_done()
+
+
+class LoadedPage(NamedTuple):
+    """Data got from page loaded in browser, html or tiles' fields
+    depending on extract mode.
+    """
+    url: str
+    data: Union[str, Dict]
+    tiles_count: int
+    is_listing_end: bool
+
+
+class PageTimings:
+    """Collect time spent on loading pages. Thread safe.
+    """
+
+    def __init__(self) -> None:
+        self.pages = 0
+        self.total: Dict[str, float] = {}
+        self.maximum: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def record(self, url: str, **timings: float) -> None:
+        logging.debug('Page %s timings: %s', url, ', '.join(
+            '{0} {1:.2f}s'.format(name, value)
+            for name, value in timings.items()
+        ))
+        with self._lock:
+            self.pages += 1
+            for name, value in timings.items():
+                self.total[name] = self.total.get(name, 0) + value
+                self.maximum[name] = max(self.maximum.get(name, 0), value)
+
+    def report(self) -> str:
+        with self._lock:
+            if not self.pages:
+                return 'no pages loaded'
+            return '{0} pages, '.format(self.pages) + ', '.join(
+                '{0}: avg {1:.2f}s max {2:.2f}s'.format(
+                    name, self.total[name] / self.pages, self.maximum[name])
+                for name in self.total
+            )
 
 
 class ItemsParser:
     """Class to retrieve item's name, external_url, image_url and price
     from category page. Uses selenium browser to load javascript content.
-    Uses multithreading to parse several pages simultaneously.
+    Uses multithreading to load several pages simultaneously, loaded
+    pages are parsed apart from browsers' threads.
     """
-    WORKERS = os.cpu_count() or 1
-    LOAD_PAGE_PAUSE_TIME = 7
-    SCROLL_PAUSE_TIME = 1
-    MAX_PAGE_WITH_LAZY_LOADING = 11
+    WORKERS = WebDriverPool.SIZE
+    CONTAINER_SELECTOR = 'div.widget-search-result-container'
+    TILES_SELECTOR = CONTAINER_SELECTOR + ' [style*="grid-column-start"]'
+    # Page is ready when results container is rendered and number of
+    # product tiles in it, 0 too, stays the same during STABLE_POLLS
+    # polls, or when timeout is over
+    LOAD_PAGE_TIMEOUT = 15
+    SCROLL_TIMEOUT = 3
+    POLL_PERIOD = 0.25
+    STABLE_POLLS = 3
+    # Lazy-loaded page is scrolled until number of tiles stops growing,
+    # at most MAX_SCROLLS times and SCROLL_BUDGET seconds. Page with
+    # pagination has all its tiles loaded and is not scrolled
+    MAX_SCROLLS = 20
+    SCROLL_BUDGET = 30
+    # 'html' parses page source with compiled XPath, 'script' collects
+    # tiles' fields in browser and transfers only them
+    EXTRACT_MODES = ('html', 'script')
+    EXTRACT_MODE = 'html'
+    # Where to parse loaded pages: 'inline', 'thread' or 'process'.
+    # In process pool parsing does not hold GIL needed by browsers'
+    # threads. At most PARSE_QUEUE_SIZE pages per browser wait for it
+    PARSE_EXECUTOR = 'process'
+    PARSE_QUEUE_SIZE = 2
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        rate_limiter: Optional[RateLimiter] = None,
+        headless: bool = True,
+        workers: Optional[int] = None,
+        extract_mode: Optional[str] = None,
+        runtime: Optional[ParserRuntime] = None,
+        parse_executor: Optional[str] = None,
+        profile: Optional[BrowserProfile] = None,
+        warm_cache: Optional[WarmProfileCache] = None
+    ) -> None:
         driver_path = Path(__file__).parent.parent.parent / 'chromedriver.exe'
         self.executable_path: Dict[str, str] = {
             'executable_path': driver_path.as_posix()
         }
         self.user_agent = UserAgent()
-        self.all_items: List[Dict] = []
-        self.max_page_number: int = 1
-        self.current_page_number: int = 0
-        self._items_lock = Lock()
-        self._max_page_lock = Lock()
-        self._current_page_lock = Lock()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.headless = headless
+        self.profile = profile or BrowserProfile()
+        # Every browser gets its own clone of warmed up user data
+        self.warm_cache = warm_cache
+        self._user_data_dirs: Dict[webdriver, str] = {}
+        self._warm_up_lock = Lock()
+        self.workers = workers or self.WORKERS
+        self.extract_mode = extract_mode or self.EXTRACT_MODE
+        if self.extract_mode not in self.EXTRACT_MODES:
+            raise ValueError(
+                'Unknown extract mode: {}'.format(self.extract_mode))
+        self.runtime = runtime or ParserRuntime()
+        self.parse_executor = parse_executor or self.PARSE_EXECUTOR
+        self._parse_slots = BoundedSemaphore(
+            self.workers * self.PARSE_QUEUE_SIZE)
+        # Browsers are shared by all parsing sessions
+        self.driver_pool = WebDriverPool(
+            self.get_browser,
+            size=self.workers,
+            on_quit=self.remove_user_data_dir
+        )
+        self.timings = PageTimings()
+        self.traffic = TrafficStats()
+        # Items of parsed pages tagged by category's url, items None
+        # mark the end of category and None the end of parsing session
+        self.results: Queue = Queue()
+        # Categories of running session by their index
+        self.categories: Dict[int, CategoryPages] = {}
+        # Number of pages of every parsed category
+        self.page_counts: Dict[str, int] = {}
+        # Set when results of running session are not needed anymore
+        self.stop_event = Event()
+
+    def get_browser(self, user_data_dir: Optional[str] = None) -> webdriver:
+        """Create Selenium browser instance. Browser uses clone of warm
+        cache if it is set and user_data_dir is not given.
+        """
+        is_clone = user_data_dir is None and self.warm_cache is not None
+        if is_clone:
+            self.warm_up()
+            user_data_dir = self.warm_cache.clone()  # type: ignore
+
+        options = webdriver.ChromeOptions()
+        if user_data_dir is not None:
+            options.add_argument('--user-data-dir={}'.format(user_data_dir))
+        if self.headless:
+            options.add_argument('headless')
+        options.add_argument('user_agent={}'.format(self.user_agent.random))
+        # Adding options to avoid accept certificate errors
+        options.add_argument('--ignore-certificate-errors')
+        options.add_argument('--ignore-ssl-errors')
+        capabilities = self.profile.apply(options)
+        try:
+            browser = webdriver.Chrome(
+                desired_capabilities=capabilities, **self.executable_path)
+        except Exception:
+            if is_clone:
+                self.warm_cache.remove(user_data_dir)  # type: ignore
+            raise
+        if is_clone:
+            self._user_data_dirs[browser] = user_data_dir  # type: ignore
+        self.profile.setup(browser)
+        return browser
+
+    def remove_user_data_dir(self, browser: webdriver) -> None:
+        """Remove clone of warm cache used by quit browser.
+        """
+        user_data_dir = self._user_data_dirs.pop(browser, None)
+        if user_data_dir is not None:
+            self.warm_cache.remove(user_data_dir)  # type: ignore
+
+    def warm_up(self) -> None:
+        """Warm up browsers' cache once, before the first browser
+        cloning it is started.
+        """
+        if self.warm_cache is None:
+            return
+        with self._warm_up_lock:
+            if not self.warm_cache.is_warm:
+                self.warm_cache.warm_up(self.get_browser)
+
+    def stop(self) -> None:
+        """Stop running session: pages left in the queue are not loaded.
+        """
+        self.stop_event.set()
+
+    def close(self) -> None:
+        """Stop running session and quit all browsers.
+        """
+        self.stop()
+        self.driver_pool.close()
+        if self.warm_cache is not None:
+            self.warm_cache.close()
+
+    def count_tiles(self, browser: webdriver) -> int:
+        """Count product tiles rendered on page, -1 if results container
+        is not rendered yet.
+        """
+        return browser.execute_script(
+            COUNT_TILES_SCRIPT, self.CONTAINER_SELECTOR, self.TILES_SELECTOR)
+
+    def has_pagination(self, browser: webdriver) -> bool:
+        """Check if page loaded in browser has pagination links.
+        """
+        return browser.execute_script(HAS_PAGINATION_SCRIPT)
+
+    def wait_for_tiles(self, browser: webdriver, timeout: float) -> int:
+        """Wait until results container is rendered and number of product
+        tiles stops changing, return number of tiles.
+        """
+        deadline = time.monotonic() + timeout
+        count, stable_polls = -1, 0
 
-    def get_browser(self, headless: bool = True) -> webdriver:
-        """Create Selenium browser instance.
+        while True:
+            current_count = self.count_tiles(browser)
+            if current_count == count and current_count >= 0:
+                stable_polls += 1
+            else:
+                stable_polls = 0
+            count = current_count
+
+            if stable_polls >= self.STABLE_POLLS \
+                    or time.monotonic() >= deadline:
+                return max(count, 0)
+            time.sleep(self.POLL_PERIOD)
+
+    def scroll_down_page(
+        self,
+        browser: webdriver,
+        tiles_count: int
+    ) -> Tuple[int, bool]:
+        """Scroll page down until number of product tiles stops growing
+        or scroll budget is over. Return number of tiles and whether
+        the end of lazy-loaded listing is reached.
         """
-        # Check context variable if browser is already created
-        driver = var_driver.get()
-        # If not - create and save to context variable
-        if driver is None:
-            options = webdriver.ChromeOptions()
-            if headless:
-                options.add_argument('headless')
-            options.add_argument('user_agent={}'.format(UserAgent().random))
-            # Adding options to avoid accept certificate errors
-            options.add_argument('--ignore-certificate-errors')
-            options.add_argument('--ignore-ssl-errors')
-            driver = webdriver.Chrome(options=options, **self.executable_path)
-            var_driver.set(driver)
-
-        return driver
-
-    def scroll_down_page(self, browser: webdriver) -> None:
-        """Scroll page down to load javascript content.
+        deadline = time.monotonic() + self.SCROLL_BUDGET
+
+        for _ in range(self.MAX_SCROLLS):
+            browser.execute_script(
+                "window.scrollTo(0, document.body.scrollHeight);")
+            count = self.wait_for_tiles(browser, self.SCROLL_TIMEOUT)
+            if count <= tiles_count:
+                return tiles_count, True
+            tiles_count = count
+            if time.monotonic() >= deadline:
+                break
+
+        logging.debug('Scroll budget is over with %s tiles loaded',
+                      tiles_count)
+        return tiles_count, False
+
+    @staticmethod
+    def get_page_number(url: str) -> int:
+        """Get number of page from its url, first page has no number.
         """
-        browser.execute_script(
-            "window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(self.SCROLL_PAUSE_TIME)
+        page_match = re.search(r'[?&]page=(\d+)', url)
+        return int(page_match.group(1)) if page_match else 1
 
     def get_max_page_number(self, soup) -> int:
-        """Get maximum page number from loaded page.
+        """Get maximum page number from pagination of loaded page,
+        0 if page has no pagination.
         """
         page_tags = soup.find_all(href=re.compile(r'page=\d+$'))
-        urls = set()
-        # Find number of page in found tags
-        for tag in page_tags:
-            page_match = re.search(
-                r'/category/\S+?page=(\d+)$',
-                tag['href']
-            )
+        return self.get_max_page_number_from_urls(
+            tag['href'] for tag in page_tags)
+
+    @staticmethod
+    def get_max_page_number_from_urls(urls: Iterable[str]) -> int:
+        """Get maximum page number from pagination links' urls.
+        """
+        numbers = set()
+        # Find number of page in found urls
+        for url in urls:
+            page_match = re.search(r'/category/\S+?page=(\d+)$', url)
             page_number = page_match.group(1) if page_match else 0
             # Add to set to get only unique ones
-            urls.add(int(page_number))
+            numbers.add(int(page_number))
 
-        return max(urls) if urls else self.MAX_PAGE_WITH_LAZY_LOADING
+        return max(numbers) if numbers else 0
 
     @staticmethod
     def get_item_external_url(tags: bs4.element.ResultSet) -> ParseResult:
@@ -253,8 +598,35 @@ class ItemsParser:
 
         return items
 
+    @staticmethod
+    def process_tiles(tiles: List[Dict]) -> List[Dict]:
+        """Get items' list from tiles' fields collected in browser.
+        """
+        items = []
+        for tile in tiles:
+            try:
+                external_url = urlparse(tile['href'])
+                name = tile['name']
+                if tile['image_url'] is None or not name \
+                        or (external_url.query and 'сертификат' in name):
+                    continue
+                price = int(tile['price'].replace('\u2009', '')[:-1]) \
+                    if tile['price'] is not None else 0
+            except Exception:
+                continue
+
+            items.append({
+                'external_url': external_url.path,
+                'image_url': tile['image_url'],
+                'name': name,
+                'price': price
+            })
+
+        return items
+
     def parse(self, soup: BeautifulSoup) -> List[Dict[str, Union[str, int]]]:
-        """Get items from page's html content.
+        """Get items from page's html content. TileExtractor gives
+        the same items without building soup.
         """
         tags_containers = soup.select('div.widget-search-result-container')
         if tags_containers:
@@ -269,26 +641,120 @@ class ItemsParser:
 
         return items_from_tags
 
-    def get_page_items(self, url: str) -> List[Dict[str, Union[str, int]]]:
-        """Get items for given url.
+    def load_page(self, url: str) -> LoadedPage:
+        """Load page in browser and take its html or tiles' fields.
         """
-        # Load browser, open url and wait content to load
-        browser = self.get_browser(headless=False)
-        time.sleep(0.01)
-        browser.get(url)
-        time.sleep(self.LOAD_PAGE_PAUSE_TIME)
-        # Scroll browser's page down to load javascript content.
-        self.scroll_down_page(browser)
-
-        soup = BeautifulSoup(browser.page_source, 'lxml')
-        # Get maximum page number from current page and update
-        # for futher parsing.
-        max_page_number = self.get_max_page_number(soup)
-        self.update_max_page_number(max_page_number)
-
-        items = self.parse(soup)
+        # Lease browser, open url and wait content to load
+        with self.driver_pool.lease() as browser:
+            self.rate_limiter.acquire(url)
+            started_at = time.monotonic()
+            browser.get(url)
+            loaded_at = time.monotonic()
+            tiles_count = self.wait_for_tiles(browser, self.LOAD_PAGE_TIMEOUT)
+            ready_at = time.monotonic()
+            # Scroll browser's page down to load javascript content.
+            is_listing_end = False
+            if tiles_count and not self.has_pagination(browser):
+                tiles_count, is_listing_end = self.scroll_down_page(
+                    browser, tiles_count)
+            scrolled_at = time.monotonic()
+            if self.extract_mode == 'script':
+                page_data = browser.execute_script(
+                    EXTRACT_TILES_SCRIPT, self.TILES_SELECTOR)
+            else:
+                page_data = browser.page_source
+            traffic = self.profile.read_traffic(browser)
+
+        self.traffic.record(url, traffic)
+        self.timings.record(
+            url,
+            load=loaded_at - started_at,
+            ready=ready_at - loaded_at,
+            scroll=scrolled_at - ready_at,
+            extract=time.monotonic() - scrolled_at
+        )
+        return LoadedPage(url, page_data, tiles_count, is_listing_end)
+
+    def update_page_numbers(
+        self,
+        category: CategoryPages,
+        page: LoadedPage,
+        max_page_number: int
+    ) -> None:
+        """Update maximum page number of category for futher parsing.
+        """
+        if max_page_number:
+            category.update_max_page_number(max_page_number)
+        else:
+            category.update_lazy_page_number(
+                self.get_page_number(page.url), page.tiles_count,
+                page.is_listing_end)
+
+    def get_page_items(
+        self,
+        url: str,
+        category: Optional[CategoryPages] = None
+    ) -> List[Dict[str, Union[str, int]]]:
+        """Get items for given url, update page numbers of category
+        it belongs to. Page is parsed in calling thread.
+        """
+        page = self.load_page(url)
+        items, max_page_number = parse_page_data(self.extract_mode, page.data)
+        if category is not None:
+            self.update_page_numbers(category, page, max_page_number)
         return items
 
+    def process_page(
+        self,
+        url: str,
+        category: CategoryPages,
+        done: Callable[[], None]
+    ) -> None:
+        """Load page in browser and hand it off to parse executor,
+        so that browser can load next page while this one is parsed.
+        Call done() when page's items are ready. Blocks when
+        PARSE_QUEUE_SIZE pages wait for parsing.
+        """
+        page = self.load_page(url)
+        executor = self.runtime.get_executor(self.parse_executor)
+        self._parse_slots.acquire()
+        if executor is None:
+            future: Future = Future()
+            try:
+                future.set_result(
+                    parse_page_data(self.extract_mode, page.data))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            try:
+                future = executor.submit(
+                    parse_page_data, self.extract_mode, page.data)
+            except Exception:
+                self._parse_slots.release()
+                raise
+        future.add_done_callback(
+            partial(self.on_page_parsed, category, page, done))
+
+    def on_page_parsed(
+        self,
+        category: CategoryPages,
+        page: LoadedPage,
+        done: Callable[[], None],
+        future: Future
+    ) -> None:
+        self._parse_slots.release()
+        try:
+            items, max_page_number = future.result()
+            self.update_page_numbers(category, page, max_page_number)
+            # Refresh the general list of items with items
+            # retrieved from the parsed URL
+            self.update_items(category, items)
+        except Exception as e:
+            logging.warning('Error occured while parsing %s: %s',
+                            page.url, e)
+        finally:
+            done()
+
     @staticmethod
     def get_pages_urls(
         url: str,
@@ -297,58 +763,126 @@ class ItemsParser:
         for page_number in numbers:
             yield page_number, '{0}?page={1}'.format(url, page_number)
 
-    def update_max_page_number(
-            self, page_number: int, force: bool = False) -> None:
-        with self._max_page_lock:
-            if page_number > self.max_page_number or force:
-                self.max_page_number = page_number
+    def add_category(self, category: CategoryPages) -> None:
+        self.categories[category.index] = category
 
-    def update_current_page_number(self, page_number: int) -> None:
-        with self._current_page_lock:
-            self.current_page_number = page_number
+    def update_items(
+        self,
+        category: CategoryPages,
+        items: List[Dict]
+    ) -> None:
+        if items:
+            self.results.put((category.url, items))
 
-    def update_items(self, items: List[Dict]) -> None:
-        with self._items_lock:
-            self.all_items.extend(items)
+    def finish_category(self, category: CategoryPages) -> None:
+        """Remember number of pages of parsed category and tell it
+        has no more items.
+        """
+        logging.debug('Category %s is parsed: %s pages',
+                      category.url, category.max_page_number)
+        self.page_counts[category.url] = category.max_page_number
+        self.results.put((category.url, None))
 
-    def get_items(self, url: str) -> List[Dict]:
-        self.all_items = []
-        # Create queue for urls to parse, event to start parsing,
-        # event to terminate parsing
+    def run_session(
+        self,
+        categories: Iterable[Tuple[str, Optional[int]]]
+    ) -> None:
+        """Parse all pages of categories putting their items to results.
+        """
+        # Create queue for urls to parse, ordered by category and page
         q: PriorityQueue = PriorityQueue()
-        update_q_event: Event = Event()
-        terminate_event: Event = Event()
-        # Create thread to produce urls for queue
+        self.categories = {}
+        # Create thread to add categories to queue and finish session
         producer_thread = ProducerThread(
             queue=q,
-            event=update_q_event,
             parser=self,
-            url=url
+            categories=categories,
+            consumers=self.workers
         )
-        producer_thread.start()
         # Create threads to get urls from queue and parse
-        consumer_threads = []
-
-        for _ in range(self.WORKERS):
-            consumer_thread = ConsumerThread(
-                queue=q,
-                event=terminate_event,
-                parser=self
-            )
-            consumer_thread.start()
-            consumer_threads.append(consumer_thread)
-        # Update maximum and current page's number to start from 1
+        consumer_threads = [
+            ConsumerThread(queue=q, parser=self)
+            for _ in range(self.workers)
+        ]
         logging.debug('Main thread: Starting session...')
-        self.update_current_page_number(0)
-        self.update_max_page_number(1, force=True)
-        update_q_event.set()
-
-        producer_thread.join()
-
-        logging.debug('Main thread: Finishing session...')
-        terminate_event.set()
+        try:
+            producer_thread.start()
+            for t in consumer_threads:
+                t.start()
+
+            producer_thread.join()
+            for t in consumer_threads:
+                t.join()
+
+            logging.debug('Main thread: Finishing session...')
+            logging.info('Page timings: %s', self.timings.report())
+        finally:
+            # Let iterating thread stop even if session failed
+            self.categories = {}
+            self.results.put(None)
+
+    def iter_categories_items(
+        self,
+        categories: Iterable[Tuple[str, Optional[int]]]
+    ) -> Generator[Tuple[str, Optional[List[Dict]]], None, None]:
+        """Parse pages of all categories by one pool of workers, yield
+        category's url with items of every parsed page as soon as it is
+        ready and with None when category is finished.
+
+        Categories are given as urls with expected number of pages,
+        known from previous run, which are queued at once instead of
+        being discovered page by page.
+
+        If iteration stops early, e.g. on exception in caller, session
+        is stopped and its threads are waited to finish pages in work.
+        """
+        self.results = Queue()
+        self.stop_event = Event()
+        session_thread = Thread(target=self.run_session, args=(categories,))
+        session_thread.start()
+
+        try:
+            while True:
+                result = self.results.get()
+                if result is None:
+                    break
+                yield result
+        finally:
+            if session_thread.is_alive():
+                self.stop()
+            session_thread.join()
 
-        for t in consumer_threads:
-            t.join()
+    def iter_items(
+        self,
+        url: str,
+        expected_pages: Optional[int] = None
+    ) -> Generator[List[Dict], None, None]:
+        """Yield items of every parsed page of category as soon
+        as it is ready.
+        """
+        for _, items in self.iter_categories_items([(url, expected_pages)]):
+            if items is not None:
+                yield items
 
-        return self.all_items
+    def get_items(
+        self,
+        url: str,
+        expected_pages: Optional[int] = None
+    ) -> List[Dict]:
+        return [item for items in self.iter_items(url, expected_pages)
+                for item in items]
+
+
+def parse_page_data(
+    extract_mode: str,
+    page_data: Union[str, Dict]
+) -> Tuple[List[Dict], int]:
+    """Get items and maximum page number from data of loaded page.
+    Module-level, so it can be sent to process pool.
+    """
+    if extract_mode == 'script':
+        items = ItemsParser.process_tiles(page_data['tiles'])
+        page_urls = page_data['pages']
+    else:
+        items, page_urls = TileExtractor().extract(page_data)
+    return items, ItemsParser.get_max_page_number_from_urls(page_urls)
@@ -0,0 +1,110 @@
+import time
+import asyncio
+from threading import Lock
+from urllib.parse import urlparse
+from typing import Dict, Tuple, Optional
+
+
+class TokenBucket:
+    """Token bucket refilled with rate tokens per second,
+    holding at most burst tokens. Thread safe.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError(
+                'Invalid rate limit: rate {0}, burst {1}'.format(rate, burst))
+        self.rate = rate
+        self.burst = burst
+        self.tokens: float = burst
+        self.updated_at = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """Take one token, return number of seconds to wait
+        before it may be used.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            # Tokens may go below zero, so the next callers
+            # queue up behind the ones already waiting
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        """Block current thread until token is available.
+        """
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Wait in event loop until token is available.
+        """
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class RateLimiter:
+    """Keep separate token bucket for every host, so that all parsers
+    making requests to the same host share its limit.
+    """
+    REQUESTS_PER_SECOND: float = 5
+    BURST: int = 10
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[int] = None
+    ) -> None:
+        self.requests_per_second = requests_per_second \
+            or self.REQUESTS_PER_SECOND
+        self.burst = burst or self.BURST
+        self.host_limits: Dict[str, Tuple[float, int]] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._lock = Lock()
+
+    def set_limit(
+        self,
+        host: str,
+        requests_per_second: float,
+        burst: int
+    ) -> None:
+        """Set limit for specific host instead of default one.
+        """
+        with self._lock:
+            self.host_limits[host] = (requests_per_second, burst)
+            self.buckets.pop(host, None)
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        """Get token bucket for url's host.
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                rate, burst = self.host_limits.get(
+                    host,
+                    (self.requests_per_second, self.burst)
+                )
+                bucket = TokenBucket(rate, burst)
+                self.buckets[host] = bucket
+        return bucket
+
+    def acquire(self, url: str) -> None:
+        """Block current thread until request to url is allowed.
+        """
+        self.get_bucket(url).acquire()
+
+    async def acquire_async(self, url: str) -> None:
+        """Wait in event loop until request to url is allowed.
+        """
+        await self.get_bucket(url).acquire_async()
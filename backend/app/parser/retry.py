@@ -0,0 +1,116 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import NamedTuple, Optional, FrozenSet
+
+
+class FetchResult(NamedTuple):
+    """Result of fetching url. Failed requests are returned with error
+    description instead of raising exceptions.
+    """
+    url: str
+    text: str = ''
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class RetryBudget:
+    """Limit total number of retries made during one run, so that
+    when site is down the run fails fast instead of retrying every url.
+    """
+
+    def __init__(self, retries: Optional[int]) -> None:
+        self.remaining = retries
+        self._lock = Lock()
+
+    def spend(self) -> bool:
+        """Take one retry from budget, return False if it is exhausted.
+        """
+        with self._lock:
+            if self.remaining is None:
+                return True
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class RetryPolicy:
+    """Describe when and how long to wait before repeating failed request.
+    Uses exponential backoff with full jitter, honours 'Retry-After'
+    header of responses.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30,
+        retry_after_max: float = 120,
+        budget: Optional[int] = 100,
+        retry_statuses: FrozenSet[int] = frozenset({429, 500, 502, 503, 504})
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_after_max = retry_after_max
+        self.budget = budget
+        self.retry_statuses = retry_statuses
+
+    def new_budget(self) -> RetryBudget:
+        """Create retry budget for one run.
+        """
+        return RetryBudget(self.budget)
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.retry_statuses
+
+    def get_backoff(self, attempt: int) -> float:
+        """Get random delay before next attempt, attempts start from 1.
+        """
+        ceiling = min(self.backoff_max,
+                      self.backoff_base * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+    @staticmethod
+    def parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Get number of seconds from 'Retry-After' header value,
+        which is either number of seconds or http date.
+        """
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+    def get_delay(
+        self,
+        attempt: int,
+        retry_after: Optional[str] = None
+    ) -> Optional[float]:
+        """Get delay before next attempt or None if request
+        should not be repeated.
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = self.parse_retry_after(retry_after)
+        if delay is None:
+            return self.get_backoff(attempt)
+        # Server asks to wait longer than we are ready to, give up
+        if delay > self.retry_after_max:
+            return None
+        return delay
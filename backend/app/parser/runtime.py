@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import multiprocessing
+from threading import Lock
+from concurrent.futures import (Executor, ThreadPoolExecutor,
+                                ProcessPoolExecutor)
+from typing import (Dict, Optional, Awaitable, AsyncGenerator, Generator,
+                    TypeVar)
+
+import httpx
+
+
+T = TypeVar('T')
+
+
+class ParserRuntime:
+    """Own event loop and pooled http client shared by all parsers
+    during the whole process, so that consecutive parser calls reuse
+    warm keep-alive connections instead of opening new ones.
+    Also own executors for CPU-bound parsing.
+    Everything is created lazily on first use and released by close(),
+    executors are not created again once runtime is closed.
+    Runtime is not thread safe, use it from one thread, except for
+    get_executor which may be called from any thread.
+    """
+    EXECUTORS = ('inline', 'thread', 'process')
+    # Process pool is started clean instead of forking process running
+    # browsers' and logging threads
+    START_METHODS = ('forkserver', 'spawn')
+    KEEPALIVE_CONNECTIONS: int = 5
+    MAX_CONNECTIONS: int = 10
+    KEEPALIVE_EXPIRY: float = 60
+    TIMEOUT: int = 10
+
+    def __init__(
+        self,
+        http2: bool = False,
+        max_workers: Optional[int] = None
+    ) -> None:
+        self.http2 = http2 and self.is_http2_available()
+        self.max_workers = max_workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[httpx.AsyncClient] = None
+        self._executors: Dict[str, Executor] = {}
+        self._is_closed = False
+        self._executors_lock = Lock()
+
+    @staticmethod
+    def is_http2_available() -> bool:
+        try:
+            import h2  # type: ignore # noqa: F401
+        except ImportError:
+            logging.warning(
+                'HTTP/2 requested but "h2" package is not installed, '
+                'falling back to HTTP/1.1'
+            )
+            return False
+        return True
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Run coroutine in runtime's event loop until it completes.
+        """
+        return self.loop.run_until_complete(coroutine)
+
+    def iterate(
+        self,
+        generator: AsyncGenerator[T, None]
+    ) -> Generator[T, None, None]:
+        """Iterate asynchronous generator from synchronous code.
+        Event loop runs while the next value is awaited, so requests
+        in flight make progress only between values taken.
+        """
+        try:
+            while True:
+                try:
+                    value = self.loop.run_until_complete(
+                        generator.__anext__())
+                except StopAsyncIteration:
+                    break
+                yield value
+        finally:
+            self.loop.run_until_complete(generator.aclose())
+
+    def get_session(self) -> httpx.AsyncClient:
+        """Return shared client for making asynchronous requests.
+        """
+        if self._session is None:
+            limits = httpx.Limits(
+                max_keepalive_connections=self.KEEPALIVE_CONNECTIONS,
+                max_connections=self.MAX_CONNECTIONS,
+                keepalive_expiry=self.KEEPALIVE_EXPIRY
+            )
+            self._session = httpx.AsyncClient(
+                limits=limits,
+                timeout=self.TIMEOUT,
+                http2=self.http2
+            )
+        return self._session
+
+    def get_executor(self, kind: str) -> Optional[Executor]:
+        """Get executor of given kind, None means run inline.
+        Raise RuntimeError if runtime is closed.
+        """
+        if kind not in self.EXECUTORS:
+            raise ValueError('Unknown executor: {}'.format(kind))
+        if kind == 'inline':
+            return None
+        with self._executors_lock:
+            if self._is_closed:
+                raise RuntimeError('Runtime is closed')
+            if kind not in self._executors:
+                self._executors[kind] = self.create_executor(kind)
+            return self._executors[kind]
+
+    def create_executor(self, kind: str) -> Executor:
+        if kind == 'thread':
+            return ThreadPoolExecutor(self.max_workers)
+        start_method = next(
+            method for method in self.START_METHODS
+            if method in multiprocessing.get_all_start_methods()
+        )
+        return ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context(start_method)
+        )
+
+    def close(self) -> None:
+        """Close executors, http client and event loop.
+        """
+        with self._executors_lock:
+            self._is_closed = True
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown()
+
+        if self._loop is None or self._loop.is_closed():
+            return
+        if self._session is not None:
+            self._loop.run_until_complete(self._session.aclose())
+            self._session = None
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
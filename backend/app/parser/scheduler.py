@@ -0,0 +1,64 @@
+import asyncio
+from typing import (TypeVar, Callable, Awaitable, Iterable, AsyncIterable,
+                    AsyncIterator, AsyncGenerator, Set, Union)
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+async def iterate_async(
+    items: Union[Iterable[T], AsyncIterable[T]]
+) -> AsyncIterator[T]:
+    """Iterate over ordinary or asynchronous iterable in the same way.
+    """
+    if hasattr(items, '__aiter__'):
+        async for item in items:  # type: ignore
+            yield item
+    else:
+        for item in items:  # type: ignore
+            yield item
+
+
+async def bounded_as_completed(
+    func: Callable[[T], Awaitable[R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    limit: int
+) -> AsyncGenerator[R, None]:
+    """Call func for every item keeping at most limit calls in flight,
+    yield results in order of completion.
+
+    Items are pulled lazily, new call is started only when one of the
+    running calls finishes, so memory does not depend on items' count.
+    """
+    if limit < 1:
+        raise ValueError('Limit must be positive: {}'.format(limit))
+
+    iterator = iterate_async(items)
+    pending: Set[asyncio.Future] = set()
+    exhausted = False
+
+    try:
+        while True:
+            # Fill the window with new calls
+            while not exhausted and len(pending) < limit:
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.ensure_future(func(item)))
+
+            if not pending:
+                break
+
+            done, pending = await asyncio.wait(
+                pending,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        # Consumer stopped early or error occured, cancel the rest
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,244 @@
+import re
+import json
+import asyncio
+import logging
+from urllib.parse import urlparse
+from typing import (Any, Tuple, List, Dict, Sequence, AsyncGenerator,
+                    Callable, Optional, Union)
+
+import httpx
+
+from .category_parser import ContentParser
+from .extractor import DataStateExtractor
+from .retry import FetchResult, RetryBudget
+
+
+PagePath = Sequence[Union[str, int]]
+
+
+def find_value(data: Any, paths: List[PagePath]) -> Any:
+    """Get value by the first of paths present in data, None if there
+    is no such path.
+    """
+    for path in paths:
+        value = data
+        for key in path:
+            try:
+                value = value[key]
+            except (KeyError, IndexError, TypeError):
+                break
+        else:
+            if value not in (None, ''):
+                return value
+    return None
+
+
+def find_atom_text(item: Dict, atom_id: str) -> Optional[str]:
+    """Get text of item's main state atom with given id.
+    """
+    for atom in item.get('mainState') or []:
+        if not isinstance(atom, dict) or atom.get('id') != atom_id:
+            continue
+        text = find_value(atom, [
+            ('atom', 'textAtom', 'text'),
+            ('atom', 'price', 'price'),
+            ('atom', 'priceWithTitle', 'price'),
+        ])
+        if text is not None:
+            return text
+    return None
+
+
+class StateItemsParser(ContentParser):
+    """Class to retrieve items from search results that category
+    page carries in 'data-state' of its widgets, without browser.
+
+    Items' fields are looked up by several known paths, so small
+    changes of state's layout do not break parsing. Pages without
+    search results' state are given to fallback, which renders them
+    in browser.
+    """
+    PATTERN: str = 'searchResultsV2'
+    PAGINATOR_PATTERN: str = 'paginator'
+    PATTERNS: List[str] = [PATTERN, PAGINATOR_PATTERN]
+    NAME_PATHS: List[PagePath] = [
+        ('cellTrackingInfo', 'title'),
+        ('title',),
+        ('name',),
+    ]
+    URL_PATHS: List[PagePath] = [
+        ('action', 'link'),
+        ('link',),
+        ('url',),
+    ]
+    IMAGE_PATHS: List[PagePath] = [
+        ('tileImage', 'items', 0, 'image', 'link'),
+        ('tileImage', 'images', 0),
+        ('images', 0, 'link'),
+        ('images', 0),
+        ('image',),
+    ]
+    PRICE_PATHS: List[PagePath] = [
+        ('cellTrackingInfo', 'finalPrice'),
+        ('cellTrackingInfo', 'price'),
+        ('finalPrice',),
+        ('price',),
+    ]
+    MAX_PAGE_PATHS: List[PagePath] = [
+        ('totalPages',),
+        ('pagesCount',),
+        ('lastPage',),
+    ]
+
+    def get_extractor(self) -> DataStateExtractor:
+        # Paginator may follow search results, so read until both found
+        return DataStateExtractor(self.PATTERNS, require_all=True)
+
+    @staticmethod
+    def get_price(value: Any) -> int:
+        """Get price in rubles from number or text like '1 299 ₽'.
+        """
+        if isinstance(value, (int, float)):
+            return int(value)
+        digits = re.sub(r'\D', '', re.split(r'[.,]', str(value))[0])
+        return int(digits) if digits else 0
+
+    def process_item(self, item: Dict) -> Optional[Dict]:
+        """Get item's fields from its state, None if item is incomplete.
+        """
+        link = find_value(item, self.URL_PATHS)
+        name = find_value(item, self.NAME_PATHS) \
+            or find_atom_text(item, 'name')
+        if not link or not name:
+            return None
+
+        external_url = urlparse(link)
+        # Filter out gift certificates like browser engine does
+        if external_url.query and 'сертификат' in name:
+            return None
+
+        price = find_value(item, self.PRICE_PATHS) \
+            or find_atom_text(item, 'price')
+        return {
+            'external_url': external_url.path,
+            'image_url': find_value(item, self.IMAGE_PATHS) or '',
+            'name': name,
+            'price': self.get_price(price) if price is not None else 0,
+        }
+
+    def get_max_page_number(self, states: Dict[str, str]) -> int:
+        """Get number of pages from paginator's state, 0 if unknown.
+        """
+        if self.PAGINATOR_PATTERN not in states:
+            return 0
+        try:
+            page_json = json.loads(states[self.PAGINATOR_PATTERN])
+        except ValueError:
+            return 0
+        value = find_value(page_json, self.MAX_PAGE_PATHS)
+        try:
+            return int(value) if value is not None else 0
+        except (TypeError, ValueError):
+            return 0
+
+    def parse(self, page_html: str) -> Optional[Dict]:
+        """Get page's items and number of pages, None if page has
+        no search results' state.
+        """
+        states = self.get_extractor().extract(page_html)
+        if self.PATTERN not in states:
+            return None
+
+        page_json = json.loads(states[self.PATTERN])
+        items = []
+        for item in page_json.get('items') or []:
+            try:
+                item_dict = self.process_item(item)
+            except Exception:
+                continue
+            if item_dict is not None:
+                items.append(item_dict)
+
+        return {
+            'items': items,
+            'max_page': self.get_max_page_number(states)
+        }
+
+    @staticmethod
+    def get_page_url(url: str, page_number: int) -> str:
+        if page_number == 1:
+            return url
+        return '{0}?page={1}'.format(url, page_number)
+
+    async def get_page_items(
+        self,
+        result: FetchResult,
+        page_content: Optional[Dict],
+        fallback: Optional[Callable[[str], List[Dict]]]
+    ) -> Tuple[List[Dict], int]:
+        """Get items and number of pages from parsed page, use fallback
+        for pages without state.
+        """
+        if page_content is not None:
+            return page_content['items'], page_content['max_page']
+
+        if not result.ok:
+            logging.warning('Skipping url %s: %s', result.url, result.error)
+            return [], 0
+        if fallback is None:
+            return [], 0
+
+        logging.info('No items state on %s, using fallback', result.url)
+        executor = self.runtime.get_executor('thread')
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(executor, fallback, result.url)
+        return items, 0
+
+    async def iter_items(
+        self,
+        url: str,
+        fallback: Optional[Callable[[str], List[Dict]]] = None
+    ) -> AsyncGenerator[List[Dict], None]:
+        """Yield items of every category's page as soon as it is parsed.
+
+        Number of pages is taken from the first page, other pages are
+        fetched concurrently. Without paginator pages are fetched one by
+        one until page with no items.
+        """
+        session: httpx.AsyncClient = self.get_session()
+        budget: RetryBudget = self.retry_policy.new_budget()
+
+        result, page_content = await self.fetch_and_parse(
+            session, url, budget)
+        items, max_page = await self.get_page_items(
+            result, page_content, fallback)
+        if items:
+            yield items
+
+        if max_page > 1:
+            urls = [self.get_page_url(url, page_number)
+                    for page_number in range(2, max_page + 1)]
+            async for result, page_content in self.map_urls(
+                    self.fetch_and_parse, urls):
+                items, _ = await self.get_page_items(
+                    result, page_content, fallback)
+                if items:
+                    yield items
+            return
+
+        if max_page:
+            return
+
+        page_number = 1
+        while items:
+            page_number += 1
+            result, page_content = await self.fetch_and_parse(
+                session, self.get_page_url(url, page_number), budget)
+            previous_items = items
+            items, _ = await self.get_page_items(
+                result, page_content, fallback)
+            # Pages after the end of listing may repeat the last one
+            if items == previous_items:
+                break
+            if items:
+                yield items
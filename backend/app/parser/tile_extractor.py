@@ -0,0 +1,91 @@
+from urllib.parse import urlparse
+from typing import List, Dict, Tuple, Optional
+
+import lxml.html  # type: ignore
+from lxml import etree  # type: ignore
+
+
+CONTAINER_XPATH = etree.XPath(
+    "(//div[contains(concat(' ', normalize-space(@class), ' '), "
+    "' widget-search-result-container ')])[1]"
+)
+TILES_XPATH = etree.XPath(".//*[contains(@style, 'grid-column-start')]")
+# Links to item: with 'context' in href or, if there are none,
+# with 'product' in href
+LINKS_XPATH = etree.XPath('.//*[contains(@href, $part)]')
+IMAGE_XPATH = etree.XPath('(.//img)[1]')
+SPAN_XPATH = etree.XPath('(.//span)[1]')
+PAGE_URL_XPATH = etree.XPath(
+    r"//@href[re:test(., 'page=\d+$')]",
+    namespaces={'re': 'http://exslt.org/regular-expressions'},
+    smart_strings=False
+)
+
+
+class TileExtractor:
+    """Get items and pagination links from category page's html with
+    compiled XPath expressions over lxml tree.
+
+    Gives the same items as ItemsParser.parse with BeautifulSoup,
+    but walks only results' container and does not build soup.
+    """
+
+    def extract(self, page_html: str) -> Tuple[List[Dict], List[str]]:
+        """Get items and urls of pagination links from page's html.
+        """
+        try:
+            root = lxml.html.fromstring(page_html)
+        except (etree.ParserError, ValueError):
+            return [], []
+        return self.get_items(root), self.get_page_urls(root)
+
+    def get_items(self, root) -> List[Dict]:
+        containers = CONTAINER_XPATH(root)
+        if not containers:
+            return []
+
+        items = []
+        for tile in TILES_XPATH(containers[0]):
+            try:
+                item = self.process_tile(tile)
+            except Exception:
+                continue
+            if item is not None:
+                items.append(item)
+        return items
+
+    @staticmethod
+    def get_name(links) -> str:
+        """Get text of the first link having only text.
+        """
+        for link in links:
+            if link.text and link.text == link.text_content():
+                return link.text
+        return ''
+
+    def process_tile(self, tile) -> Optional[Dict]:
+        links = LINKS_XPATH(tile, part='context') \
+            or LINKS_XPATH(tile, part='product')
+
+        external_url = urlparse(links[0].attrib['href'])
+        image_url = IMAGE_XPATH(links[0])[0].attrib['src']
+        name = self.get_name(links)
+        if not name or (external_url.query and 'сертификат' in name):
+            return None
+
+        spans = SPAN_XPATH(links[1]) or SPAN_XPATH(links[-1])
+        price = int(spans[0].text_content().replace('\u2009', '')[:-1]) \
+            if spans else 0
+
+        return {
+            'external_url': external_url.path,
+            'image_url': image_url,
+            'name': name,
+            'price': price
+        }
+
+    @staticmethod
+    def get_page_urls(root) -> List[str]:
+        """Get urls of links to pages of category.
+        """
+        return PAGE_URL_XPATH(root)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import List, Dict, Set, Tuple, Optional
+
+from .category_parser import SubcategoryParser, Pattern
+
+
+class CategoryTreeCrawler:
+    """Build the whole categories' tree in one run.
+
+    Pages are crawled breadth-first and concurrently starting from
+    parent categories: every category page gives its children and their
+    sections, sections are crawled further until no new categories
+    are found or max_depth is reached. Categories are deduplicated
+    by cleaned url, so every category appears in the tree once.
+
+    Pages of categories on levels below max_depth are crawled, roots
+    are on level 1. max_depth is MAX_DEPTH by default, 0 or None as
+    MAX_DEPTH lift the limit.
+    """
+    MAX_DEPTH: Optional[int] = 6
+
+    def __init__(
+        self,
+        parser: SubcategoryParser,
+        base_url: str,
+        max_depth: Optional[int] = None
+    ) -> None:
+        self.parser = parser
+        self.base_url = base_url
+        if max_depth is None:
+            max_depth = self.MAX_DEPTH
+        elif max_depth < 0:
+            raise ValueError('Negative max depth: {}'.format(max_depth))
+        self.max_depth = max_depth or None
+        self.seen_urls: Set[str] = set()
+        self.queue: Optional[asyncio.Queue] = None
+
+    def add_child(
+        self,
+        parent: Dict,
+        name: str,
+        url: str
+    ) -> Optional[Dict]:
+        """Add category to parent's sections if it was not seen before.
+        """
+        url = Pattern.get_cleaned_url(url)
+        if url in self.seen_urls:
+            return None
+        self.seen_urls.add(url)
+
+        node: Dict = {'name': name, 'url': url, 'sections': []}
+        parent['sections'].append(node)
+        return node
+
+    def enqueue(self, node: Dict, depth: int) -> None:
+        """Schedule crawling of category's page.
+        """
+        if self.max_depth is None or depth < self.max_depth:
+            self.queue.put_nowait((node, depth))  # type: ignore
+
+    def attach(
+        self,
+        node: Dict,
+        page_content: List[Dict],
+        depth: int
+    ) -> None:
+        """Add categories found on node's page to the tree.
+        """
+        for category in page_content:
+            child = self.add_child(node, category['name'], category['url'])
+            if child is None:
+                continue
+
+            for section in category.get('sections', []):
+                grandchild = self.add_child(
+                    child, section['name'], section['url'])
+                if grandchild is not None:
+                    self.enqueue(grandchild, depth + 2)
+            # Children of category without sections are still unknown
+            if not child['sections']:
+                self.enqueue(child, depth + 1)
+
+    async def worker(self, queue: asyncio.Queue, session, budget) -> None:
+        while True:
+            node, depth = await queue.get()
+            url = '{0}{1}'.format(self.base_url, node['url'])
+            try:
+                result, page_content = await self.parser.fetch_and_parse(
+                    session, url, budget)
+                if result.ok:
+                    self.attach(node, page_content, depth)
+                else:
+                    logging.warning('Skipping url %s: %s', url, result.error)
+            except Exception as e:
+                logging.warning('Error occured while crawling %s: %s',
+                                url, e)
+            finally:
+                queue.task_done()
+
+    async def crawl(self, roots: List[Dict]) -> List[Dict]:
+        """Crawl categories starting from roots, return tree of
+        categories with their children in 'sections'.
+        """
+        # Queue is created here to be bound to the running event loop
+        self.queue = asyncio.Queue()
+        tree: Dict = {'sections': []}
+        for category in roots:
+            node = self.add_child(tree, category['name'], category['url'])
+            if node is not None:
+                self.enqueue(node, 1)
+
+        session = self.parser.get_session()
+        budget = self.parser.retry_policy.new_budget()
+        workers = [
+            asyncio.ensure_future(self.worker(self.queue, session, budget))
+            for _ in range(self.parser.CONCURRENCY)
+        ]
+        try:
+            await self.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        logging.info('Crawled %s categories', len(self.seen_urls))
+        return tree['sections']
+
+    @staticmethod
+    def count_categories(tree: List[Dict]) -> Tuple[int, int]:
+        """Get number of categories and depth of tree.
+        """
+        count, depth = 0, 0
+        for category in tree:
+            children_count, children_depth = \
+                CategoryTreeCrawler.count_categories(category['sections'])
+            count += 1 + children_count
+            depth = max(depth, 1 + children_depth)
+        return count, depth
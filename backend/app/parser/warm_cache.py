@@ -0,0 +1,97 @@
+import os
+import shutil
+import logging
+import subprocess
+import uuid
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from selenium import webdriver  # type: ignore
+
+
+class WarmProfileCache:
+    """Chrome user data directory warmed up once per run and cloned
+    for every browser, so static assets are downloaded once instead
+    of once per browser.
+
+    Clones are made with copy-on-write where file system supports it
+    ('cp --reflink=auto'), otherwise files are copied. Every clone is
+    removed when its browser quits.
+    """
+    DIRECTORY: str = 'cache/browser'
+    WARM_UP_URLS: List[str] = ['https://www.ozon.ru/']
+    # Files of running browser which must not get to clones
+    LOCK_FILES: List[str] = [
+        'SingletonLock', 'SingletonSocket', 'SingletonCookie']
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        warm_up_urls: Optional[List[str]] = None
+    ) -> None:
+        self.directory = Path(directory or self.DIRECTORY)
+        self.template_path = self.directory / 'template'
+        self.clones_path = self.directory / 'workers'
+        self.warm_up_urls = warm_up_urls or self.WARM_UP_URLS
+        self.is_warm = False
+
+    def warm_up(
+        self,
+        browser_factory: Callable[[Optional[str]], webdriver]
+    ) -> None:
+        """Load warm-up pages in browser using template directory,
+        so that its disk cache gets page's static assets.
+        """
+        # Clones left by previous runs are not used by anyone
+        shutil.rmtree(self.clones_path, ignore_errors=True)
+        self.template_path.mkdir(parents=True, exist_ok=True)
+
+        browser = browser_factory(self.template_path.as_posix())
+        try:
+            for url in self.warm_up_urls:
+                browser.get(url)
+        except Exception as e:
+            logging.warning('Error occured while warming up cache: %s', e)
+        finally:
+            browser.quit()
+        self.is_warm = True
+        logging.info('Browser cache is warmed up in %s', self.template_path)
+
+    def clone(self) -> str:
+        """Copy template directory for new browser, return its path.
+        """
+        self.clones_path.mkdir(parents=True, exist_ok=True)
+        path = self.clones_path / uuid.uuid4().hex
+        if not self.template_path.exists():
+            path.mkdir()
+            return path.as_posix()
+
+        try:
+            subprocess.run(
+                ['cp', '-a', '--reflink=auto',
+                 self.template_path.as_posix(), path.as_posix()],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            logging.debug('Unable to clone with cp, copying: %s', e)
+            shutil.rmtree(path, ignore_errors=True)
+            shutil.copytree(
+                self.template_path, path,
+                ignore=shutil.ignore_patterns(*self.LOCK_FILES))
+        else:
+            for name in self.LOCK_FILES:
+                lock_path = path / name
+                if os.path.lexists(lock_path):
+                    os.remove(lock_path)
+        return path.as_posix()
+
+    @staticmethod
+    def remove(path: str) -> None:
+        shutil.rmtree(path, ignore_errors=True)
+
+    def close(self) -> None:
+        """Remove clones of every browser.
+        """
+        shutil.rmtree(self.clones_path, ignore_errors=True)
@@ -0,0 +1,161 @@
+import os
+import atexit
+import logging
+from queue import LifoQueue, Empty
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Callable, Iterator, Optional, Set
+
+from selenium import webdriver  # type: ignore
+from selenium.common.exceptions import WebDriverException  # type: ignore
+
+try:
+    import psutil  # type: ignore
+except ImportError:
+    psutil = None
+
+
+class PooledDriver:
+    """Driver with its usage statistics.
+    """
+
+    def __init__(
+        self,
+        driver: webdriver,
+        on_quit: Optional[Callable[[webdriver], None]] = None
+    ) -> None:
+        self.driver = driver
+        self.on_quit = on_quit
+        self.pages = 0
+        self.is_broken = False
+
+    def get_memory(self) -> Optional[float]:
+        """Get memory used by driver's browser processes in megabytes,
+        None if it can not be measured.
+        """
+        if psutil is None:
+            return None
+        try:
+            process = psutil.Process(self.driver.service.process.pid)
+            processes = [process] + process.children(recursive=True)
+            rss = sum(p.memory_info().rss for p in processes)
+        except (AttributeError, psutil.Error):
+            return None
+        return rss / 1024 / 1024
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logging.debug('Error occured while quitting driver: %s', e)
+        if self.on_quit is not None:
+            self.on_quit(self.driver)
+
+
+class WebDriverPool:
+    """Pool of Selenium drivers living for the whole run.
+
+    Drivers are created lazily, at most size at the same time, and
+    leased to worker threads one at a time. Driver is recycled after
+    max_pages pages, when its browser takes more than max_memory
+    megabytes (measured only if 'psutil' is installed) or when it
+    breaks. Every driver is quit on close() or at exit, on_quit
+    is called with driver after it is quit.
+    """
+    SIZE: int = os.cpu_count() or 1
+    MAX_PAGES: int = 50
+    MAX_MEMORY: float = 1024
+
+    def __init__(
+        self,
+        driver_factory: Callable[[], webdriver],
+        size: Optional[int] = None,
+        max_pages: Optional[int] = None,
+        max_memory: Optional[float] = None,
+        on_quit: Optional[Callable[[webdriver], None]] = None
+    ) -> None:
+        self.driver_factory = driver_factory
+        self.on_quit = on_quit
+        self.size = size or self.SIZE
+        self.max_pages = max_pages or self.MAX_PAGES
+        self.max_memory = max_memory or self.MAX_MEMORY
+        self.idle: LifoQueue = LifoQueue()
+        self.drivers: Set[PooledDriver] = set()
+        self._slots = BoundedSemaphore(self.size)
+        self._lock = Lock()
+        self._is_closed = False
+        if psutil is None:
+            logging.warning('Driver pool: psutil is not installed, drivers '
+                            'are not recycled by memory usage')
+        atexit.register(self.close)
+
+    def acquire(self) -> PooledDriver:
+        """Take idle driver or create new one, block if all drivers
+        are leased. Raise RuntimeError if pool is closed.
+        """
+        self._slots.acquire()
+        if self._is_closed:
+            self._slots.release()
+            raise RuntimeError('Driver pool is closed')
+        try:
+            return self.idle.get(block=False)
+        except Empty:
+            pass
+        try:
+            pooled = PooledDriver(self.driver_factory(), self.on_quit)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.drivers.add(pooled)
+        logging.debug('Driver pool: started driver, %s in total',
+                      len(self.drivers))
+        return pooled
+
+    def needs_recycling(self, pooled: PooledDriver) -> bool:
+        if pooled.is_broken or pooled.pages >= self.max_pages:
+            return True
+        memory = pooled.get_memory()
+        return memory is not None and memory > self.max_memory
+
+    def discard(self, pooled: PooledDriver) -> None:
+        with self._lock:
+            self.drivers.discard(pooled)
+        pooled.quit()
+
+    def release(self, pooled: PooledDriver) -> None:
+        """Return driver to pool or quit it if it has to be recycled.
+        """
+        if self._is_closed or self.needs_recycling(pooled):
+            logging.debug('Driver pool: recycling driver after %s pages',
+                          pooled.pages)
+            self.discard(pooled)
+        else:
+            self.idle.put(pooled)
+        self._slots.release()
+
+    @contextmanager
+    def lease(self) -> Iterator[webdriver]:
+        """Lease driver for loading one page.
+        """
+        pooled = self.acquire()
+        try:
+            yield pooled.driver
+        except WebDriverException:
+            pooled.is_broken = True
+            raise
+        finally:
+            pooled.pages += 1
+            self.release(pooled)
+
+    def close(self) -> None:
+        """Quit every driver.
+        """
+        self._is_closed = True
+        while not self.idle.empty():
+            self.idle.get(block=False)
+        with self._lock:
+            drivers = list(self.drivers)
+            self.drivers.clear()
+        for pooled in drivers:
+            pooled.quit()
@@ -0,0 +1,108 @@
+"""Compare saving category tree:
+- orm: level by level with ORM bulk inserts and a commit for every
+  parent's sections, the way parser saved it before (baseline);
+- levels: level by level with multi-row upserts
+  (DatabaseSaver.save_categories_to_database);
+- loader: in one transaction with multi-row inserts
+  (DatabaseSaver.load_category_tree).
+
+Requires PostgreSQL database of 'test' config, its tables are created
+and dropped by benchmark.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_category_tree [children_per_level ...]
+
+Tree has 3 levels with given number of children on every level.
+"""
+import sys
+import time
+import string
+import itertools
+from typing import List, Dict, Iterator, Optional
+
+from app import create_app, db
+from app.models import Category
+from app.commands.utils import DatabaseSaver
+
+
+LEVELS = 3
+
+
+def iter_names() -> Iterator[str]:
+    """Yield unique names made of letters, as slugs can not contain
+    digits.
+    """
+    for size in itertools.count(1):
+        for letters in itertools.product(string.ascii_lowercase,
+                                         repeat=size):
+            yield ''.join(letters)
+
+
+def get_tree(children: int, levels: int, names: Iterator[str]) -> List[Dict]:
+    """Get categories like parser saves them.
+    """
+    categories = []
+    for _ in range(children):
+        name = next(names)
+        category = {
+            'name': name.capitalize(),
+            'url': '/category/{}-{}/'.format(name, len(name))
+        }
+        if levels > 1:
+            category['sections'] = get_tree(children, levels - 1, names)
+        categories.append(category)
+    return categories
+
+
+def save_with_orm(categories: List[Dict],
+                  parent: Optional[Category] = None) -> None:
+    category_objects = [
+        Category(name=category['name'], url=category['url'], parent=parent)
+        for category in categories
+    ]
+    db.session.bulk_save_objects(category_objects)
+    db.session.commit()
+    for category, category_obj in zip(categories, category_objects):
+        if category.get('sections'):
+            save_with_orm(category['sections'], category_obj)
+
+
+def clear_categories() -> None:
+    Category.query.delete()
+    db.session.commit()
+
+
+def main(sizes: List[int]) -> None:
+    app = create_app('test')
+    with app.app_context():
+        db.create_all()
+        try:
+            saver = DatabaseSaver(session=db.session)
+            for size in sizes:
+                tree = get_tree(size, LEVELS, iter_names())
+                count = len(saver.flatten_category_trees([(tree, None)]))
+                results = {}
+                for name, function in [
+                        ('orm', save_with_orm),
+                        ('levels', saver.save_categories_to_database),
+                        ('loader', saver.load_category_tree)]:
+                    clear_categories()
+                    started = time.perf_counter()
+                    function(tree)
+                    results[name] = time.perf_counter() - started
+                    if Category.query.count() != count:
+                        raise AssertionError('Not all categories are saved')
+
+                print('{} categories:'.format(count))
+                for name, seconds in results.items():
+                    print('{0:>10}: {1:.3f} s, {2:.0f} rows/s, '
+                          '{3:.1f}x of orm'.format(
+                              name, seconds, count / seconds,
+                              results['orm'] / seconds))
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [5, 15])
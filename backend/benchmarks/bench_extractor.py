@@ -0,0 +1,72 @@
+"""Compare extraction of 'data-state' with BeautifulSoup and
+with DataStateExtractor.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_extractor [saved_page.html ...]
+
+Without arguments pages are generated from parse_results samples.
+"""
+import re
+import sys
+import timeit
+from typing import List, Dict
+
+from bs4 import BeautifulSoup  # type: ignore
+
+from app.parser.category_parser import CategoryParser, SubcategoryParser
+from app.parser.extractor import DataStateExtractor
+from .fixtures import get_category_page, get_subcategory_pages
+
+
+PATTERNS: List[str] = [CategoryParser.PATTERN] + SubcategoryParser.PATTERNS
+REPEAT = 5
+
+
+def extract_with_soup(page_html: str) -> Dict[str, str]:
+    """Previous way of finding states: build tree, search by id.
+    """
+    soup = BeautifulSoup(page_html, 'lxml')
+    states = {}
+    for pattern in PATTERNS:
+        tag = soup.find(id=re.compile(pattern))
+        if tag:
+            states[pattern] = tag['data-state']
+    return states
+
+
+def extract_with_scanner(page_html: str) -> Dict[str, str]:
+    return DataStateExtractor(PATTERNS).extract(page_html)
+
+
+def load_pages(paths: List[str]) -> List[str]:
+    if not paths:
+        return [get_category_page()] + get_subcategory_pages()
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def main(paths: List[str]) -> None:
+    pages = load_pages(paths)
+    size = sum(len(page) for page in pages) / 1024 / 1024
+    print('Pages: {0}, total size: {1:.1f} MB'.format(len(pages), size))
+
+    for page in pages:
+        if extract_with_soup(page) != extract_with_scanner(page):
+            raise AssertionError('Extracted states differ')
+
+    results = {}
+    for name, function in [('beautifulsoup', extract_with_soup),
+                           ('scanner', extract_with_scanner)]:
+        timer = timeit.Timer(lambda: [function(page) for page in pages])
+        results[name] = min(timer.repeat(repeat=REPEAT, number=1))
+        print('{0:>14}: {1:.3f} s'.format(name, results[name]))
+
+    print('Speedup: {:.1f}x'.format(
+        results['beautifulsoup'] / results['scanner']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,81 @@
+"""Compare getting items from page loaded in browser by transferring
+page source and parsing it with TileExtractor ('html' mode) and by
+collecting tiles' fields in browser ('script' mode).
+
+Requires Chrome and chromedriver like ItemsParser does.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_items_extraction [saved_page.html ...]
+
+Without arguments pages are generated with product tiles.
+"""
+import sys
+import timeit
+import tempfile
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+from app.parser.items_parser import (ItemsParser, EXTRACT_TILES_SCRIPT,
+                                     parse_page_data)
+from .fixtures import get_items_page
+
+
+REPEAT = 5
+
+
+def extract_with_html(parser: ItemsParser, browser) -> Tuple[List[Dict], int]:
+    return parse_page_data('html', browser.page_source)
+
+
+def extract_with_script(
+    parser: ItemsParser,
+    browser
+) -> Tuple[List[Dict], int]:
+    page_data = browser.execute_script(
+        EXTRACT_TILES_SCRIPT, parser.TILES_SELECTOR)
+    return parse_page_data('script', page_data)
+
+
+def save_pages(paths: List[str], directory: str) -> List[str]:
+    """Get paths of pages to open, generate them if not given.
+    """
+    if paths:
+        return [Path(path).resolve().as_uri() for path in paths]
+    uris = []
+    for seed, count in enumerate([12, 36, 72]):
+        path = Path(directory) / 'items_{}.html'.format(count)
+        path.write_text(get_items_page(count, seed=seed), encoding='utf-8')
+        uris.append(path.resolve().as_uri())
+    return uris
+
+
+def main(paths: List[str]) -> None:
+    parser = ItemsParser(workers=1)
+    browser = parser.get_browser()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for uri in save_pages(paths, directory):
+                browser.get(uri)
+                items, max_page = extract_with_html(parser, browser)
+                if (items, max_page) != extract_with_script(parser, browser):
+                    raise AssertionError('Extracted items differ')
+
+                print('{0}: {1} items, {2} pages'.format(
+                    uri.rsplit('/', 1)[-1], len(items), max_page))
+                results = {}
+                for name, function in [('html', extract_with_html),
+                                       ('script', extract_with_script)]:
+                    timer = timeit.Timer(lambda: function(parser, browser))
+                    results[name] = min(timer.repeat(repeat=REPEAT, number=1))
+                    print('{0:>10}: {1:.3f} s'.format(name, results[name]))
+
+                print('Speedup: {:.1f}x'.format(
+                    results['html'] / results['script']))
+    finally:
+        browser.quit()
+        parser.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,119 @@
+"""Compare saving items and prices:
+- orm: page by page with ORM bulk inserts, the way parser saved them
+  before upserts and COPY (baseline);
+- pages: page by page with multi-row upserts
+  (DatabaseSaver.save_items_to_database);
+- copy: with COPY to staging table (DatabaseSaver.copy_items_to_database).
+
+Requires PostgreSQL database of 'test' config, its tables are created
+and dropped by benchmark.
+
+Usage (from backend directory):
+    python -m benchmarks.bench_items_ingest [number_of_items ...]
+"""
+import sys
+import time
+import random
+from typing import List, Dict
+
+from app import create_app, db
+from app.models import Category, Item, Price
+from app.commands.utils import DatabaseSaver
+
+
+CATEGORY_SIZE = 1000
+
+
+def get_items(count: int, seed: int = 0) -> List[Dict]:
+    """Get items like parser saves them.
+    """
+    rnd = random.Random(seed)
+    return [
+        {
+            'external_url': '/context/detail/id/{}/'.format(number),
+            'image_url': 'https://cdn1.ozone.ru/s3/multimedia-{}/6000.jpg'
+                         .format(number),
+            'name': 'Товар номер {}'.format(number),
+            'price': rnd.randint(100, 200000)
+        }
+        for number in rnd.sample(range(10 ** 6, 10 ** 8), count)
+    ]
+
+
+def clear_items() -> None:
+    Price.query.delete()
+    Item.query.delete()
+    db.session.commit()
+
+
+def ingest_with_orm(saver: DatabaseSaver, category: Category,
+                    items: List[Dict]) -> None:
+    session = saver.session
+    for start in range(0, len(items), CATEGORY_SIZE):
+        page = items[start:start + CATEGORY_SIZE]
+        session.bulk_save_objects([
+            Item(name=item['name'], url=item['external_url'],
+                 image_url=item['image_url'], category_slug=category.slug)
+            for item in page
+        ])
+        session.commit()
+        session.bulk_insert_mappings(Price, [
+            {'value': item['price'],
+             'item_id': Item.get_id(item['external_url'])}
+            for item in page
+        ])
+        session.commit()
+
+
+def ingest_by_pages(saver: DatabaseSaver, category: Category,
+                    items: List[Dict]) -> None:
+    # Parser saves items by pages
+    for start in range(0, len(items), CATEGORY_SIZE):
+        saver.save_items_to_database(
+            items[start:start + CATEGORY_SIZE], category)
+
+
+def ingest_with_copy(saver: DatabaseSaver, category: Category,
+                     items: List[Dict]) -> None:
+    saver.copy_items_to_database(
+        (category.slug, items[start:start + CATEGORY_SIZE])
+        for start in range(0, len(items), CATEGORY_SIZE)
+    )
+
+
+def main(counts: List[int]) -> None:
+    app = create_app('test')
+    with app.app_context():
+        db.create_all()
+        try:
+            saver = DatabaseSaver(session=db.session)
+            saver.load_category_tree(
+                [{'name': 'Bench', 'url': '/category/bench-1/'}])
+            category = Category.query.get('bench')
+
+            for count in counts:
+                items = get_items(count)
+                results = {}
+                for name, function in [('orm', ingest_with_orm),
+                                       ('pages', ingest_by_pages),
+                                       ('copy', ingest_with_copy)]:
+                    clear_items()
+                    started = time.perf_counter()
+                    function(saver, category, items)
+                    results[name] = time.perf_counter() - started
+                    if Price.query.count() != count:
+                        raise AssertionError('Not all prices are saved')
+
+                print('{} items:'.format(count))
+                for name, seconds in results.items():
+                    print('{0:>10}: {1:.3f} s, {2:.0f} rows/s, '
+                          '{3:.1f}x of orm'.format(
+                              name, seconds, count / seconds,
+                              results['orm'] / seconds))
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main([int(count) for count in sys.argv[1:]] or [10000, 100000])
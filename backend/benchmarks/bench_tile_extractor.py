@@ -0,0 +1,67 @@
+"""Compare getting items from category page's html with BeautifulSoup
+(ItemsParser.parse) and with compiled XPath (TileExtractor).
+
+Usage (from backend directory):
+    python -m benchmarks.bench_tile_extractor [saved_page.html ...]
+
+Without arguments pages are generated with product tiles.
+"""
+import sys
+import timeit
+from typing import List, Dict, Tuple
+
+from bs4 import BeautifulSoup  # type: ignore
+
+from app.parser.items_parser import ItemsParser
+from app.parser.tile_extractor import TileExtractor
+from .fixtures import get_items_page
+
+
+REPEAT = 5
+# Parsing methods do not use browser
+PARSER = ItemsParser.__new__(ItemsParser)
+
+
+def extract_with_soup(page_html: str) -> Tuple[List[Dict], int]:
+    soup = BeautifulSoup(page_html, 'lxml')
+    return PARSER.parse(soup), PARSER.get_max_page_number(soup)
+
+
+def extract_with_xpath(page_html: str) -> Tuple[List[Dict], int]:
+    items, page_urls = TileExtractor().extract(page_html)
+    return items, PARSER.get_max_page_number_from_urls(page_urls)
+
+
+def load_pages(paths: List[str]) -> List[str]:
+    if not paths:
+        return [get_items_page(count, seed=seed)
+                for seed, count in enumerate([12, 36, 72])]
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+def main(paths: List[str]) -> None:
+    pages = load_pages(paths)
+    size = sum(len(page) for page in pages) / 1024 / 1024
+    print('Pages: {0}, total size: {1:.1f} MB'.format(len(pages), size))
+
+    for page in pages:
+        if extract_with_soup(page) != extract_with_xpath(page):
+            raise AssertionError('Extracted items differ')
+
+    results = {}
+    for name, function in [('beautifulsoup', extract_with_soup),
+                           ('xpath', extract_with_xpath)]:
+        timer = timeit.Timer(lambda: [function(page) for page in pages])
+        results[name] = min(timer.repeat(repeat=REPEAT, number=1))
+        print('{0:>14}: {1:.3f} s'.format(name, results[name]))
+
+    print('Speedup: {:.1f}x'.format(
+        results['beautifulsoup'] / results['xpath']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,127 @@
+import json
+import html
+import random
+from pathlib import Path
+from typing import List, Dict
+
+
+SAMPLES_DIRECTORY = Path(__file__).parent.parent / 'parse_results'
+
+
+def load_sample(name: str):
+    with open(SAMPLES_DIRECTORY / name, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_filler(size: int, seed: int = 0) -> str:
+    """Get html of ordinary page's markup of approximately given size.
+    """
+    rnd = random.Random(seed)
+    blocks = []
+    length = 0
+    while length < size:
+        number = rnd.randint(0, 10 ** 6)
+        block = (
+            '<div class="a{0} b{1}" id="block-{0}" data-widget="w{1}">'
+            '<a href="/context/detail/id/{0}/"><span>Text {0}</span></a>'
+            '<script>var x{0} = "{1}";</script></div>\n'
+            .format(number, rnd.randint(0, 100))
+        )
+        blocks.append(block)
+        length += len(block)
+    return ''.join(blocks)
+
+
+def get_state_tag(widget_id: str, state: Dict) -> str:
+    return '<div id="{0}" data-state=\'{1}\'></div>'.format(
+        widget_id,
+        html.escape(json.dumps(state, ensure_ascii=False), quote=True)
+    )
+
+
+def get_category_page(size: int = 3 * 1024 * 1024) -> str:
+    """Get main page with 'catalogMenu' widget in the middle.
+    """
+    categories = [
+        {'title': category['name'], 'url': category['url']}
+        for category in load_sample('parent_categories_sample.json')
+    ]
+    state_tag = get_state_tag(
+        'state-catalogMenu-1234567-default-1',
+        {'categories': categories}
+    )
+    return '<html><body>{0}{1}{2}</body></html>'.format(
+        get_filler(size // 2, seed=1), state_tag, get_filler(size // 2))
+
+
+def get_subcategory_pages(
+    size: int = 3 * 1024 * 1024,
+    count: int = 3
+) -> List[str]:
+    """Get pages with 'catalogHorizontalMenu' widget built
+    from subcategories sample.
+    """
+    pages = []
+    samples = list(load_sample('subcategories_sample.json').values())
+    for subcategories in samples[:count]:
+        categories = [
+            {
+                'title': category['name'],
+                'url': category['url'],
+                'section': [
+                    {'title': section['name'], 'url': section['url']}
+                    for section in category.get('sections', [])
+                ]
+            }
+            for category in subcategories
+        ]
+        state_tag = get_state_tag(
+            'state-catalogHorizontalMenu-7654321-default-1',
+            {'categories': categories}
+        )
+        pages.append('<html><body>{0}{1}{2}</body></html>'.format(
+            get_filler(size // 3, seed=2), state_tag,
+            get_filler(size * 2 // 3)))
+    return pages
+
+
+def get_item_tile(number: int, rnd: random.Random) -> str:
+    """Get html of product tile in the way category page renders it.
+    """
+    price = '{:,}'.format(rnd.randint(100, 200000)).replace(',', '\u2009')
+    return (
+        '<div class="tile" style="grid-column-start: span 3;">'
+        '<a href="/context/detail/id/{0}/"><div class="image">'
+        '<img src="https://cdn1.ozone.ru/s3/multimedia-{0}/6000.jpg" '
+        'loading="lazy"></div></a>'
+        '<div class="info"><a href="/context/detail/id/{0}/">'
+        '<div class="price"><span>{1}\u2009₽</span>'
+        '<span class="old">{1}\u2009₽</span></div></a>'
+        '<a href="/context/detail/id/{0}/">Товар номер {0}</a>'
+        '<div class="rating"><span>{2} отзывов</span></div></div></div>'
+    ).format(number, price, rnd.randint(0, 1000))
+
+
+def get_items_page(
+    count: int = 36,
+    max_page: int = 10,
+    size: int = 1024 * 1024,
+    seed: int = 0
+) -> str:
+    """Get category page with count product tiles and pagination.
+    """
+    rnd = random.Random(seed)
+    tiles = ''.join(
+        get_item_tile(rnd.randint(10 ** 6, 10 ** 8), rnd)
+        for _ in range(count)
+    )
+    pagination = ''.join(
+        '<a href="/category/knigi-16500/?page={0}">{0}</a>'.format(number)
+        for number in range(2, max_page + 1)
+    )
+    return (
+        '<html><body>{0}<div class="widget-search-result-container">'
+        '<div class="grid">{1}</div></div><div class="pagination">{2}'
+        '</div>{3}</body></html>'
+    ).format(get_filler(size // 2, seed=seed), tiles, pagination,
+             get_filler(size // 2, seed=seed + 1))
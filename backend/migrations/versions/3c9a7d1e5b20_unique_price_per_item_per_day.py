@@ -0,0 +1,31 @@
+"""unique price per item per day
+
+Revision ID: 3c9a7d1e5b20
+Revises: f55f9bacec73
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9a7d1e5b20'
+down_revision = 'f55f9bacec73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the last price saved for item on every day
+    op.execute(sa.text(
+        'DELETE FROM prices USING prices AS later '
+        'WHERE prices.item_id = later.item_id '
+        'AND prices.date = later.date AND prices.id < later.id'
+    ))
+    op.create_unique_constraint(
+        'uq_prices_item_id_date', 'prices', ['item_id', 'date'])
+
+
+def downgrade():
+    op.drop_constraint('uq_prices_item_id_date', 'prices', type_='unique')
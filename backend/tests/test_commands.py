@@ -1,8 +1,13 @@
+import datetime
 from unittest import TestCase
 from unittest.mock import patch
 
-from app import create_app
+from sqlalchemy_utils import Ltree
+
+from app import create_app, db
+from app.models import Category, Item, Price
 from app.commands.launch_parser import launch_parser
+from app.commands.utils import DatabaseSaver
 
 
 class TestCommands(TestCase):
@@ -51,3 +56,216 @@ class TestCommands(TestCase):
     def test_launch_parser_items(self, mock_launcher):
         self.runner.invoke(launch_parser, ['--parse', 'items'])
         self.assertTrue(mock_launcher.called)
+
+
+class TestDatabaseSaver(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('test')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        db.create_all()
+        self.database_saver = DatabaseSaver(session=db.session)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def test_load_category_tree(self):
+        '''Ensure category tree is saved with paths of all levels.
+        '''
+        categories = [
+            {
+                'name': 'Electronics',
+                'url': '/category/electronics-15500/',
+                'sections': [
+                    {
+                        'name': 'TV',
+                        'url': '/category/tv-15528/',
+                        'sections': [
+                            {'name': 'Smart TV',
+                             'url': '/category/smart-tv-15529/'}
+                        ]
+                    },
+                    {'name': 'Not category', 'url': '/highlight/sale/'}
+                ]
+            },
+            {'name': 'Electronics', 'url': '/category/electronics-15500/'}
+        ]
+
+        stats = self.database_saver.load_category_tree(categories)
+
+        self.assertEqual(stats.rows, 3)
+        self.assertEqual(Category.query.count(), 3)
+        self.assertEqual(
+            Category.query.get('smart_tv').path,
+            Ltree('electronics.tv.smart_tv')
+        )
+
+    def test_load_category_tree_with_parent(self):
+        '''Ensure sections get path of given parent category.
+        '''
+        self.database_saver.load_category_tree(
+            [{'name': 'Electronics', 'url': '/category/electronics-15500/'}])
+        parent = Category.query.get('electronics')
+
+        self.database_saver.load_category_tree(
+            [{'name': 'TV', 'url': '/category/tv-15528/'}], parent)
+
+        self.assertEqual(
+            Category.query.get('tv').path, Ltree('electronics.tv'))
+
+    def test_load_category_with_same_slug(self):
+        '''Ensure category with slug already saved under another parent
+        does not change path and url of saved one.
+        '''
+        self.database_saver.load_category_tree([
+            {
+                'name': 'Electronics',
+                'url': '/category/electronics-15500/',
+                'sections': [{'name': 'Accessories',
+                              'url': '/category/accessories-15600/'}]
+            }
+        ])
+        self.database_saver.load_category_tree([
+            {
+                'name': 'Clothes',
+                'url': '/category/clothes-7500/',
+                'sections': [{'name': 'Accessories',
+                              'url': '/category/accessories-7600/'}]
+            }
+        ])
+        self.database_saver.save_categories_to_database([
+            {'name': 'Accessories', 'url': '/category/accessories-7600/'}
+        ], Category.query.get('clothes'))
+
+        category = Category.query.get('accessories')
+        self.assertEqual(category.path, Ltree('electronics.accessories'))
+        self.assertEqual(category.url, '/category/accessories-15600/')
+
+    def test_save_subcategories_to_database(self):
+        '''Ensure subcategories of every parent are saved with
+        parent's path.
+        '''
+        self.database_saver.load_category_tree([
+            {'name': 'Electronics', 'url': '/category/electronics-15500/'},
+            {'name': 'Clothes', 'url': '/category/clothes-7500/'}
+        ])
+        parents = Category.query.filter(Category.is_parent()).all()
+
+        stats = self.database_saver.save_subcategories_to_database({
+            '/category/electronics-15500/': [
+                {'name': 'TV', 'url': '/category/tv-15528/'}],
+            '/category/clothes-7500/': [
+                {'name': 'Shoes', 'url': '/category/shoes-17777/'}],
+        }, parents)
+
+        self.assertEqual(stats.inserted, 2)
+        self.assertEqual(
+            Category.query.get('tv').path, Ltree('electronics.tv'))
+        self.assertEqual(
+            Category.query.get('shoes').path, Ltree('clothes.shoes'))
+
+    def test_copy_items_to_database(self):
+        '''Ensure copied items are saved once with their last price.
+        '''
+        self.database_saver.load_category_tree(
+            [{'name': 'TV', 'url': '/category/tv-15528/'}])
+        items = [
+            {'external_url': '/context/detail/id/{}/'.format(number),
+             'image_url': 'img', 'name': 'Item', 'price': number}
+            for number in [1, 2, 2]
+        ]
+        items.append({'external_url': '/highlight/sale/',
+                      'image_url': 'img', 'name': 'Not item', 'price': 3})
+
+        stats = self.database_saver.copy_items_to_database(
+            [('tv', items[:2]), ('tv', items[2:])])
+
+        self.assertEqual(stats.rows, 3)
+        self.assertEqual(Item.query.count(), 2)
+        self.assertEqual(
+            [(price.item_id, price.value) for price in Price.query.order_by(
+                Price.item_id)],
+            [(1, 1), (2, 2)]
+        )
+
+    def test_copy_items_to_database_updates_changed(self):
+        '''Ensure copying items again updates only changed ones.
+        '''
+        self.database_saver.load_category_tree(
+            [{'name': 'TV', 'url': '/category/tv-15528/'}])
+        items = [
+            {'external_url': '/context/detail/id/{}/'.format(number),
+             'image_url': 'img', 'name': 'Item', 'price': number}
+            for number in [1, 2]
+        ]
+        self.database_saver.copy_items_to_database([('tv', items)])
+
+        items[1] = dict(items[1], name='Renamed item')
+        stats = self.database_saver.copy_items_to_database([('tv', items)])
+
+        self.assertEqual(
+            (stats.inserted, stats.updated, stats.unchanged), (0, 1, 1))
+        self.assertEqual(Item.query.get(2).name, 'Renamed item')
+
+    def test_save_prices_only_on_change(self):
+        '''Ensure price is written only if it differs from the last one
+        and item gets one price per day.
+        '''
+        self.database_saver.load_category_tree(
+            [{'name': 'TV', 'url': '/category/tv-15528/'}])
+        category = Category.query.get('tv')
+        items = [
+            {'external_url': '/context/detail/id/{}/'.format(number),
+             'image_url': 'img', 'name': 'Item', 'price': 100}
+            for number in [1, 2]
+        ]
+        self.database_saver.save_items_to_database(items, category)
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        Price.query.update({'date': yesterday})
+        db.session.commit()
+
+        items[1] = dict(items[1], price=90)
+        self.database_saver.save_items_to_database(items, category)
+        written = self.database_saver.save_prices_to_database(
+            [{'item_id': 2, 'value': 80}])
+
+        self.assertEqual(written, 1)
+        self.assertEqual(
+            [(price.item_id, price.value) for price in Price.query.order_by(
+                Price.item_id, Price.date)],
+            [(1, 100), (2, 100), (2, 80)]
+        )
+
+    def test_save_reverted_price(self):
+        '''Ensure price changed and changed back during one day leaves
+        only the last price of previous day.
+        '''
+        self.database_saver.load_category_tree(
+            [{'name': 'TV', 'url': '/category/tv-15528/'}])
+        category = Category.query.get('tv')
+        items = [{'external_url': '/context/detail/id/1/',
+                  'image_url': 'img', 'name': 'Item', 'price': 100}]
+        self.database_saver.save_items_to_database(items, category)
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        Price.query.update({'date': yesterday})
+        db.session.commit()
+
+        self.database_saver.save_prices_to_database(
+            [{'item_id': 1, 'value': 90}])
+        written = self.database_saver.save_prices_to_database(
+            [{'item_id': 1, 'value': 100}])
+
+        self.assertEqual(written, 0)
+        self.assertEqual(
+            [(price.date, price.value) for price in Price.query],
+            [(yesterday, 100)]
+        )
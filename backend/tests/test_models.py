@@ -2,7 +2,7 @@ from unittest import TestCase
 from sqlalchemy_utils import Ltree
 
 from app import create_app, db
-from app.models import Category, Item
+from app.models import Category, Item, UpsertResult, upsert
 from app.factories import CategoryFactory
 
 
@@ -61,28 +61,29 @@ class TestModels(TestCase):
 
         self.assertEqual(item.id, '21131')
 
-    def test_insert_ignore(self):
-        '''Ensure inserting query ignores on conflict.
+    def test_upsert(self):
+        '''Ensure upsert updates only changed rows on conflict.
         '''
-        category1 = Category(
-            name='First category',
-            url='/category/cat-256121'
-        )
-        category2 = Category(
-            name='Second category',
-            url='/category/cat-two-256121',
-        )
-        db.session.bulk_save_objects([category1, category2])
-
-        category3 = Category(
-            name='Third category',
-            url='/category/cat-three-256121',
+        rows = [
+            {'name': 'First category', 'slug': 'cat',
+             'url': '/category/cat-256121', 'path': Ltree('cat')},
+            {'name': 'Second category', 'slug': 'cat_two',
+             'url': '/category/cat-two-256121', 'path': Ltree('cat_two')},
+        ]
+        result = upsert(db.session, Category, rows)
+        self.assertEqual(result, UpsertResult(2, 0, 0))
+
+        rows[1] = dict(rows[1], name='Renamed category')
+        rows.append(
+            {'name': 'Third category', 'slug': 'cat_three',
+             'url': '/category/cat-three-256121', 'path': Ltree('cat_three')}
         )
-        db.session.bulk_save_objects(
-            [category1, category2, category3])
+        result = upsert(db.session, Category, rows)
 
-        categories_len = Category.query.count()
-        self.assertEqual(categories_len, 3)
+        self.assertEqual(result, UpsertResult(1, 1, 1))
+        self.assertEqual(Category.query.count(), 3)
+        self.assertEqual(
+            Category.query.get('cat_two').name, 'Renamed category')
 
     def test_is_parent(self):
         '''Ensure is_parent method works as expected.
@@ -0,0 +1,992 @@
+import os
+import json
+import time
+import asyncio
+from queue import PriorityQueue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+import httpx
+from bs4 import BeautifulSoup
+
+from app.parser import Parser
+from app.parser.browser_profile import (BrowserProfile, PageTraffic,
+                                        TrafficStats)
+from app.parser.cache import ResponseCache
+from app.parser.category_parser import SubcategoryParser
+from app.parser.extractor import DataStateExtractor
+from app.parser.items_parser import (EXTRACT_TILES_SCRIPT,
+                                     HAS_PAGINATION_SCRIPT, CategoryPages,
+                                     ItemsParser, LoadedPage, PageTimings)
+from app.parser.rate_limiter import RateLimiter, TokenBucket
+from app.parser.retry import FetchResult, RetryPolicy
+from app.parser.runtime import ParserRuntime
+from app.parser.scheduler import bounded_as_completed
+from app.parser.state_items_parser import StateItemsParser
+from app.parser.tile_extractor import TileExtractor
+from app.parser.tree_crawler import CategoryTreeCrawler
+from app.parser.warm_cache import WarmProfileCache
+from app.parser.webdriver_pool import WebDriverPool
+
+
+class TestScheduler(TestCase):
+
+    def test_bounded_as_completed(self):
+        '''Ensure scheduler keeps limited number of calls in flight
+        and returns every result.
+        '''
+        in_flight = 0
+        max_in_flight = 0
+
+        async def work(number):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.001 * (number % 3))
+            in_flight -= 1
+            return number * 2
+
+        async def collect():
+            return [
+                result async for result in
+                bounded_as_completed(work, range(20), 4)
+            ]
+
+        results = asyncio.run(collect())
+
+        self.assertEqual(sorted(results), [n * 2 for n in range(20)])
+        self.assertEqual(max_in_flight, 4)
+
+    def test_bounded_as_completed_pulls_lazily(self):
+        '''Ensure scheduler takes items from iterable only when
+        there is free place for them.
+        '''
+        pulled = []
+
+        async def urls():
+            for number in range(100):
+                pulled.append(number)
+                yield number
+
+        async def work(number):
+            return number
+
+        async def take_first():
+            async for result in bounded_as_completed(work, urls(), 3):
+                return result
+
+        asyncio.run(take_first())
+
+        self.assertEqual(len(pulled), 3)
+
+
+class TestParserRuntime(TestCase):
+
+    def test_iterate(self):
+        '''Ensure asynchronous generator may be consumed lazily
+        from synchronous code in runtime's loop.
+        '''
+        runtime = ParserRuntime()
+        produced = []
+
+        async def numbers():
+            for number in range(5):
+                await asyncio.sleep(0)
+                produced.append(number)
+                yield number
+
+        for number in runtime.iterate(numbers()):
+            self.assertEqual(produced[-1], number)
+            if number == 2:
+                break
+        runtime.close()
+
+        self.assertEqual(produced, [0, 1, 2])
+
+    def test_shared_executor(self):
+        '''Ensure threads taking executor at once get the same one.
+        '''
+        runtime = ParserRuntime()
+        with ThreadPoolExecutor(8) as threads:
+            executors = set(threads.map(
+                lambda _: runtime.get_executor('thread'), range(8)))
+        runtime.close()
+
+        self.assertEqual(len(executors), 1)
+
+    def test_closed_executors(self):
+        '''Ensure executors are not created again after close.
+        '''
+        runtime = ParserRuntime()
+        runtime.get_executor('thread')
+        runtime.close()
+
+        self.assertIsNone(runtime.get_executor('inline'))
+        with self.assertRaises(RuntimeError):
+            runtime.get_executor('thread')
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_backoff_grows_and_stops(self):
+        '''Ensure backoff is limited by exponential ceiling and
+        retries stop after max attempts.
+        '''
+        policy = RetryPolicy(max_attempts=3, backoff_base=1, backoff_max=10)
+
+        for attempt, ceiling in [(1, 1), (2, 2)]:
+            delay = policy.get_delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, ceiling)
+        self.assertIsNone(policy.get_delay(3))
+
+    def test_retry_after(self):
+        '''Ensure 'Retry-After' header is honoured.
+        '''
+        policy = RetryPolicy(retry_after_max=60)
+
+        self.assertEqual(policy.get_delay(1, '5'), 5)
+        self.assertIsNone(policy.get_delay(1, '600'))
+        self.assertEqual(
+            policy.get_delay(1, 'Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+
+    def test_budget(self):
+        '''Ensure retry budget is shared and exhausted.
+        '''
+        budget = RetryPolicy(budget=2).new_budget()
+
+        self.assertTrue(budget.spend())
+        self.assertTrue(budget.spend())
+        self.assertFalse(budget.spend())
+
+
+class TestRateLimiter(TestCase):
+
+    def test_token_bucket(self):
+        '''Ensure bucket allows burst and then spaces out requests.
+        '''
+        bucket = TokenBucket(rate=10, burst=2)
+
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+    def test_bucket_per_host(self):
+        '''Ensure every host gets its own bucket and limit.
+        '''
+        limiter = RateLimiter(requests_per_second=1, burst=1)
+        limiter.set_limit('cdn.ozon.ru', 20, 5)
+
+        bucket = limiter.get_bucket('https://www.ozon.ru/category/')
+        self.assertIs(bucket, limiter.get_bucket('https://www.ozon.ru/'))
+        self.assertIsNot(bucket, limiter.get_bucket('https://cdn.ozon.ru/'))
+        self.assertEqual(limiter.get_bucket('https://cdn.ozon.ru/').burst, 5)
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lookup(self):
+        '''Ensure stored responses are returned fresh within ttl
+        and with validators after it.
+        '''
+        cache = ResponseCache(self.directory.name)
+        url = 'https://www.ozon.ru/category/elektronika-15500/'
+
+        self.assertEqual(cache.lookup(url), (None, False))
+        cache.put(url, '<html></html>', etag='"abc"')
+
+        entry, is_fresh = cache.lookup(url)
+        self.assertTrue(is_fresh)
+        self.assertEqual(entry.text, '<html></html>')
+
+        cache.ttl = 0
+        entry, is_fresh = cache.lookup(url)
+        self.assertFalse(is_fresh)
+        self.assertEqual(
+            entry.get_conditional_headers(), {'If-None-Match': '"abc"'})
+        cache.put(url, '<html>new</html>')
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['stale'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+
+    def test_eviction(self):
+        '''Ensure cache does not grow over max size.
+        '''
+        cache = ResponseCache(self.directory.name, max_size=1)
+
+        cache.put('https://www.ozon.ru/1/', 'first')
+        cache.put('https://www.ozon.ru/2/', 'second')
+
+        self.assertEqual(cache.lookup('https://www.ozon.ru/1/'),
+                         (None, False))
+        self.assertEqual(cache.stats['evicted'], 2)
+
+
+class TestDataStateExtractor(TestCase):
+    PAGE = (
+        '<html><div id="other" data-state=\'{"a": 1}\'></div>'
+        '<div class="c" id="state-objectLine-1-default-1" '
+        'data-state="{&quot;items&quot;: []}"></div>'
+        '<div id="state-catalogHorizontalMenu-2-default-1" '
+        'data-state=\'{"categories": [{"title": "tv &amp; video", '
+        '"url": "/category/tv-15528/?from=menu", "section": []}]}\'>'
+        '</div></html>'
+    )
+
+    def test_extract(self):
+        '''Ensure states of all patterns are found in one pass.
+        '''
+        states = DataStateExtractor(
+            SubcategoryParser.PATTERNS).extract(self.PAGE)
+
+        self.assertEqual(states, {
+            'objectLine': '{"items": []}',
+            'catalogHorizontalMenu': (
+                '{"categories": [{"title": "tv & video", '
+                '"url": "/category/tv-15528/?from=menu", "section": []}]}'
+            )
+        })
+
+    def test_feed_by_chunks(self):
+        '''Ensure chunks split anywhere give the same result.
+        '''
+        expected = DataStateExtractor(
+            SubcategoryParser.PATTERNS).extract(self.PAGE)
+        page_bytes = self.PAGE.encode('utf-8')
+
+        for size in [1, 7, 64]:
+            extractor = DataStateExtractor(SubcategoryParser.PATTERNS)
+            for i in range(0, len(page_bytes), size):
+                extractor.feed(page_bytes[i:i + size])
+            extractor.feed(b'', final=True)
+            self.assertEqual(extractor.states, expected)
+
+    def test_skip_scripts(self):
+        '''Ensure ids inside scripts' bodies are not taken for tags',
+        split by chunks.
+        '''
+        page = (
+            '<html><SCRIPT type="text/javascript">var tile = \''
+            '<div id="state-objectLine-1" data-state="{}"></div>\';'
+            '</script >'
+            '<script>var id = "objectLine";</script>'
+            '<div id="state-objectLine-2" data-state=\'{"items": []}\'>'
+            '</div></html>'
+        )
+
+        for size in [1, 7, 64, len(page)]:
+            extractor = DataStateExtractor(['objectLine'])
+            for i in range(0, len(page), size):
+                extractor.feed(page[i:i + size])
+            extractor.feed('', final=True)
+            self.assertEqual(extractor.states, {'objectLine': '{"items": []}'})
+
+    def test_feed_long_tag(self):
+        '''Ensure end of tag is found after quoted values containing
+        '>' and quotes of the other kind, split by chunks.
+        '''
+        state = '{"text": "a > b, \'c\'"}' * 100
+        page = ('<div id="state-objectLine-1" title=\'"x">\' '
+                'data-state=\'{}\'></div>').format(state.replace("'", '&#39;'))
+
+        for size in [1, 5, 64]:
+            extractor = DataStateExtractor(['objectLine'])
+            for i in range(0, len(page), size):
+                extractor.feed(page[i:i + size])
+            extractor.feed('', final=True)
+            self.assertEqual(extractor.states, {'objectLine': state})
+
+    @skipUnless(hasattr(httpx, 'MockTransport'),
+                'httpx has no MockTransport')
+    def test_stream_until_found(self):
+        '''Ensure streamed response is closed once state is found and
+        only downloaded part of body is returned, decoded with charset
+        of response.
+        '''
+        page = ('<html><div id="state-searchCategorySubtree-1" '
+                'data-state=\'{"categories": ["Телевизоры"]}\'></div>')
+        tail = '<div>' + 'x' * 1024 + '</div>'
+        chunks = [part.encode('windows-1251') for part in [
+            page[:40], page[40:], tail, tail, tail]]
+        sent = []
+
+        async def stream_body():
+            for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+
+        def handler(request):
+            return httpx.Response(
+                200, content=stream_body(),
+                headers={'Content-Type': 'text/html; charset=windows-1251'})
+
+        parser = SubcategoryParser.__new__(SubcategoryParser)
+        session = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        runtime = ParserRuntime()
+
+        async def request():
+            try:
+                return await parser.request(
+                    session, 'https://www.ozon.ru/category/tv/', {})
+            finally:
+                await session.aclose()
+
+        response, text = runtime.run(request())
+        runtime.close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(text, page)
+        self.assertEqual(len(sent), 2)
+
+    def test_subcategory_parser(self):
+        '''Ensure subcategory parser takes pattern with
+        the highest priority.
+        '''
+        parser = SubcategoryParser.__new__(SubcategoryParser)
+
+        self.assertEqual(parser.parse(self.PAGE), [{
+            'name': 'Tv & video',
+            'url': '/category/tv-15528/',
+            'sections': []
+        }])
+
+
+class FakeSubcategoryParser(SubcategoryParser):
+    """Return predefined pages' content instead of making requests.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.retry_policy = RetryPolicy()
+        self.requested = []
+
+    def get_session(self):
+        return None
+
+    async def fetch_and_parse(self, session, url, budget=None):
+        self.requested.append(url)
+        return FetchResult(url), self.pages.get(url, [])
+
+
+class TestCategoryTreeCrawler(TestCase):
+
+    def test_crawl(self):
+        '''Ensure crawler follows sections to any depth and adds
+        every category once.
+        '''
+        parser = FakeSubcategoryParser({
+            'https://ozon.ru/category/a-1/': [
+                {'name': 'B', 'url': '/category/b-2/', 'sections': [
+                    {'name': 'C', 'url': '/category/c-3/?from=menu'}
+                ]},
+                {'name': 'D', 'url': '/category/d-4/', 'sections': []},
+            ],
+            'https://ozon.ru/category/c-3/': [
+                {'name': 'E', 'url': '/category/e-5', 'sections': []},
+                {'name': 'B', 'url': '/category/b-2/', 'sections': []},
+            ],
+        })
+        crawler = CategoryTreeCrawler(parser, 'https://ozon.ru')
+
+        tree = asyncio.run(crawler.crawl(
+            [{'name': 'A', 'url': '/category/a-1/'}]))
+
+        self.assertEqual(tree, [{
+            'name': 'A', 'url': '/category/a-1/', 'sections': [
+                {'name': 'B', 'url': '/category/b-2/', 'sections': [
+                    {'name': 'C', 'url': '/category/c-3/', 'sections': [
+                        {'name': 'E', 'url': '/category/e-5/',
+                         'sections': []}
+                    ]}
+                ]},
+                {'name': 'D', 'url': '/category/d-4/', 'sections': []},
+            ]
+        }])
+        self.assertEqual(CategoryTreeCrawler.count_categories(tree), (5, 4))
+        # B is not requested, its children came with page of A
+        self.assertEqual(len(parser.requested), 4)
+
+    def test_max_depth(self):
+        '''Ensure pages are crawled on levels below max depth,
+        MAX_DEPTH by default and without limit for 0.
+        '''
+        pages = {
+            'https://ozon.ru/category/{}-{}/'.format(name, number): [
+                {'name': child, 'url': '/category/{}-{}/'.format(
+                    child, number + 1)}
+            ]
+            for number, (name, child) in enumerate(
+                zip('abcd', 'bcde'), start=1)
+        }
+
+        class ShallowCrawler(CategoryTreeCrawler):
+            MAX_DEPTH = 2
+
+        for max_depth, depth in [(None, 2), (3, 3), (0, 5)]:
+            crawler = ShallowCrawler(
+                FakeSubcategoryParser(pages), 'https://ozon.ru', max_depth)
+            tree = asyncio.run(crawler.crawl(
+                [{'name': 'a', 'url': '/category/a-1/'}]))
+            self.assertEqual(
+                CategoryTreeCrawler.count_categories(tree), (depth, depth))
+
+        with self.assertRaises(ValueError):
+            CategoryTreeCrawler(FakeSubcategoryParser(pages), '', -1)
+
+
+class FakeDriver:
+
+    def __init__(self):
+        self.is_quit = False
+
+    def quit(self):
+        self.is_quit = True
+
+
+class TestWebDriverPool(TestCase):
+
+    def test_lease_and_recycle(self):
+        '''Ensure drivers are reused, recycled after max pages and
+        quit on close.
+        '''
+        pool = WebDriverPool(FakeDriver, size=2, max_pages=2)
+
+        with pool.lease() as first:
+            pass
+        with pool.lease() as second:
+            self.assertIs(first, second)
+        self.assertTrue(first.is_quit)
+
+        with pool.lease() as third:
+            self.assertIsNot(third, first)
+        pool.close()
+
+        self.assertTrue(third.is_quit)
+        self.assertEqual(pool.drivers, set())
+
+    def test_on_quit(self):
+        quit_drivers = []
+        pool = WebDriverPool(FakeDriver, size=1, on_quit=quit_drivers.append)
+
+        with pool.lease() as driver:
+            pass
+        pool.close()
+
+        self.assertEqual(quit_drivers, [driver])
+
+    def test_closed_pool(self):
+        '''Ensure closed pool does not start new drivers.
+        '''
+        pool = WebDriverPool(FakeDriver, size=1)
+        pool.close()
+
+        with self.assertRaises(RuntimeError):
+            with pool.lease():
+                pass
+        self.assertEqual(pool.drivers, set())
+
+
+class FakeScrollBrowser:
+    """Load next portion of tiles on every scroll until there is no more.
+    Results container is rendered after render_polls counts of tiles.
+    """
+
+    def __init__(self, total, portion=10, render_polls=0, paginated=False):
+        self.total = total
+        self.portion = portion
+        self.count = min(total, portion)
+        self.render_polls = render_polls
+        self.paginated = paginated
+        self.polls = 0
+        self.scrolls = 0
+
+    def get(self, url):
+        pass
+
+    def get_log(self, log_type):
+        return []
+
+    def execute_script(self, script, *args):
+        if script.startswith('window.scrollTo'):
+            self.scrolls += 1
+            self.count = min(self.total, self.count + self.portion)
+            return None
+        if script == HAS_PAGINATION_SCRIPT:
+            return self.paginated
+        if script == EXTRACT_TILES_SCRIPT:
+            return {'tiles': [], 'pages': []}
+        self.polls += 1
+        return -1 if self.polls <= self.render_polls else self.count
+
+
+class FakeDriverPool:
+
+    def __init__(self, browser):
+        self.browser = browser
+
+    @contextmanager
+    def lease(self):
+        yield self.browser
+
+
+class FakeItemsParser(ItemsParser):
+    """Load pages which know about given maximum pages of their
+    category, the page with maximum 0 is after the end of listing.
+    Every page has one item named by its number.
+    """
+
+    def __init__(self, max_pages, delay=0):
+        self.max_pages = max_pages
+        self.delay = delay
+        self.loaded = []
+        self.workers = 3
+        self.page_counts = {}
+        self.timings = PageTimings()
+        self.extract_mode = 'script'
+        self.runtime = ParserRuntime()
+        self.parse_executor = 'thread'
+        self._parse_slots = BoundedSemaphore(1)
+        self.warm_cache = None
+
+    def load_page(self, url):
+        time.sleep(self.delay)
+        self.loaded.append(url)
+        category_url, _ = url.split('?') if '?' in url else (url, None)
+        page_number = self.get_page_number(url)
+        max_page = self.max_pages[category_url].get(page_number, page_number)
+        if max_page == 0:
+            return LoadedPage(url, {'tiles': [], 'pages': []}, 0, False)
+
+        tile = {'href': '/context/detail/id/{}/'.format(page_number),
+                'image_url': 'img', 'name': str(page_number), 'price': '1 '}
+        pages = ['{0}?page={1}'.format(category_url, max_page)]
+        return LoadedPage(url, {'tiles': [tile], 'pages': pages}, 1, True)
+
+    def iter_categories_items(self, categories):
+        try:
+            for url, items in super().iter_categories_items(categories):
+                yield url, items and [int(item['name']) for item in items]
+        finally:
+            self.runtime.close()
+
+
+class TestItemsParser(TestCase):
+
+    def setUp(self):
+        # Avoid starting browsers and getting user agents
+        self.parser = ItemsParser.__new__(ItemsParser)
+        self.parser.POLL_PERIOD = 0
+        # Waits end on stable number of tiles long before timeouts
+        self.parser.LOAD_PAGE_TIMEOUT = 10
+        self.parser.SCROLL_TIMEOUT = 10
+
+    def test_wait_for_tiles(self):
+        '''Ensure empty page is ready once its container is rendered
+        and number of tiles stays 0.
+        '''
+        browser = FakeScrollBrowser(total=0, render_polls=2)
+
+        started = time.monotonic()
+        self.assertEqual(self.parser.wait_for_tiles(browser, 10), 0)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(browser.polls, 2 + 1 + self.parser.STABLE_POLLS)
+
+    def test_scroll_until_end(self):
+        browser = FakeScrollBrowser(total=35)
+
+        started = time.monotonic()
+        self.assertEqual(self.parser.scroll_down_page(browser, 10), (35, True))
+        self.assertLess(time.monotonic() - started, 1)
+        # The last scroll finds no new tiles
+        self.assertEqual(browser.scrolls, 4)
+
+    def test_load_page_timings(self):
+        '''Ensure empty and paginated pages are ready without waiting
+        for timeouts and paginated one is not scrolled.
+        '''
+        self.parser.rate_limiter = RateLimiter()
+        self.parser.extract_mode = 'script'
+        self.parser.profile = BrowserProfile()
+        self.parser.traffic = TrafficStats()
+        self.parser.timings = PageTimings()
+
+        self.parser.driver_pool = FakeDriverPool(
+            FakeScrollBrowser(total=0, render_polls=2))
+        page = self.parser.load_page('/category/a/?page=3')
+        self.assertEqual(page.tiles_count, 0)
+
+        browser = FakeScrollBrowser(total=100, portion=30, paginated=True)
+        self.parser.driver_pool = FakeDriverPool(browser)
+        page = self.parser.load_page('/category/a/')
+        self.assertEqual(page.tiles_count, 30)
+        self.assertEqual(browser.scrolls, 0)
+
+        self.assertEqual(self.parser.timings.pages, 2)
+        self.assertLess(self.parser.timings.maximum['ready'], 1)
+        self.assertLess(self.parser.timings.maximum['scroll'], 1)
+
+    def test_scroll_budget(self):
+        self.parser.MAX_SCROLLS = 2
+        browser = FakeScrollBrowser(total=100)
+
+        self.assertEqual(
+            self.parser.scroll_down_page(browser, 10), (30, False))
+
+    def test_tile_extractor(self):
+        '''Ensure XPath extractor gives the same items and pages
+        as BeautifulSoup.
+        '''
+        page = (
+            '<div class="grid widget-search-result-container">'
+            '<div style="grid-column-start: 1">'
+            '<a href="/context/detail/id/1/"><img src="img/1"></a>'
+            '<a href="/context/detail/id/1/"><span>1\u2009299\u2009₽</span>'
+            '</a><a href="/context/detail/id/1/">Книга</a></div>'
+            '<div style="grid-column-start: 2">'
+            '<a href="/context/detail/id/2/?asb=1"><img src="img/2"></a>'
+            '<a href="/context/detail/id/2/">Подарочный сертификат</a></div>'
+            '<div style="grid-column-start: 3">'
+            '<a href="/product/3/"><img src="img/3"></a>'
+            '<a href="/product/3/"><b>New</b>Ручка</a>'
+            '<a href="/product/3/">Ручка <!-- x -->синяя</a></div>'
+            '<div style="grid-column-start: 4">'
+            '<a href="/product/4/"><img></a><a href="/product/4/">Ручка</a>'
+            '</div></div>'
+            '<a href="/category/a/?page=2">2</a>'
+            '<a href="/category/a/?page=7">7</a>'
+        )
+        parser = ItemsParser.__new__(ItemsParser)
+        soup = BeautifulSoup(page, 'lxml')
+
+        items, page_urls = TileExtractor().extract(page)
+
+        self.assertEqual(items, parser.parse(soup))
+        self.assertEqual(len(items), 1)
+        self.assertEqual(parser.get_max_page_number_from_urls(page_urls),
+                         parser.get_max_page_number(soup))
+
+    def test_process_tiles(self):
+        '''Ensure tiles collected in browser give the same items
+        as page source.
+        '''
+        tiles = [
+            {'href': '/context/detail/id/1/?asb=1', 'image_url': 'img/1',
+             'name': 'Книга', 'price': '1\u2009299\u2009₽'},
+            {'href': '/context/detail/id/2/?asb=1', 'image_url': 'img/2',
+             'name': 'Подарочный сертификат', 'price': '500\u2009₽'},
+            {'href': '/context/detail/id/3/', 'image_url': None,
+             'name': 'Ручка', 'price': '50\u2009₽'},
+            {'href': '/context/detail/id/4/', 'image_url': 'img/4',
+             'name': 'Ручка', 'price': None},
+        ]
+
+        self.assertEqual(ItemsParser.process_tiles(tiles), [
+            {'external_url': '/context/detail/id/1/', 'image_url': 'img/1',
+             'name': 'Книга', 'price': 1299},
+            {'external_url': '/context/detail/id/4/', 'image_url': 'img/4',
+             'name': 'Ручка', 'price': 0},
+        ])
+        self.assertEqual(ItemsParser.get_max_page_number_from_urls([
+            '/category/a/?page=2', '/category/a/?page=12']), 12)
+
+    def test_lazy_page_number(self):
+        '''Ensure maximum page follows lazy pages until the end
+        of listing is found and never goes past it.
+        '''
+        queue = PriorityQueue()
+        category = CategoryPages(0, '/category/a/', queue)
+        category.start()
+
+        category.update_lazy_page_number(1, 30, False)
+        self.assertEqual(category.max_page_number, 2)
+
+        category.update_lazy_page_number(2, 30, True)
+        self.assertEqual(category.max_page_number, 2)
+        category.update_max_page_number(5)
+        self.assertEqual(category.max_page_number, 2)
+
+        category.update_lazy_page_number(2, 0, False)
+        self.assertEqual(category.max_page_number, 1)
+        self.assertEqual(queue.qsize(), 2)
+
+        self.assertEqual(ItemsParser.get_page_number('/category/a/'), 1)
+        self.assertEqual(
+            ItemsParser.get_page_number('/category/a/?page=3'), 3)
+
+    def test_session(self):
+        '''Ensure pages are queued as soon as they are found and pages
+        after the end of listing are skipped.
+        '''
+        parser = FakeItemsParser({'/category/a/': {1: 3, 3: 5, 5: 5, 6: 0}})
+
+        items = parser.get_items('/category/a/', expected_pages=6)
+
+        self.assertEqual(sorted(items), [1, 2, 3, 4, 5])
+        self.assertEqual(parser.page_counts, {'/category/a/': 5})
+
+    def test_categories_session(self):
+        '''Ensure pages of all categories are parsed by one pool and
+        the end of every category follows all its items.
+        '''
+        parser = FakeItemsParser({
+            '/category/a/': {1: 4},
+            '/category/b/': {1: 1},
+            '/category/c/': {1: 2},
+        })
+
+        results = list(parser.iter_categories_items([
+            ('/category/a/', None),
+            ('/category/b/', None),
+            ('/category/c/', 2),
+        ]))
+
+        for url, pages in [('/category/a/', [1, 2, 3, 4]),
+                           ('/category/b/', [1]),
+                           ('/category/c/', [1, 2])]:
+            category_results = [items for result_url, items in results
+                                if result_url == url]
+            self.assertIsNone(category_results[-1])
+            self.assertEqual(
+                sorted(sum(category_results[:-1], [])), pages)
+        self.assertEqual(parser.page_counts['/category/a/'], 4)
+
+    def test_stop_session(self):
+        '''Ensure session stops loading pages when iteration stops.
+        '''
+        parser = FakeItemsParser({'/category/a/': {}}, delay=0.01)
+        results = parser.iter_categories_items([('/category/a/', 100)])
+
+        next(results)
+        results.close()
+
+        loaded = len(parser.loaded)
+        self.assertLess(loaded, 100)
+        self.assertTrue(parser.stop_event.is_set())
+        time.sleep(0.05)
+        self.assertEqual(len(parser.loaded), loaded)
+
+
+class FakeStateItemsParser(StateItemsParser):
+    """Fetch pages from predefined html instead of making requests.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.runtime = ParserRuntime()
+        self.retry_policy = RetryPolicy()
+        self.parse_executor = 'inline'
+        self.cache = None
+
+    def get_session(self):
+        return None
+
+    async def fetch(self, session, url, budget=None):
+        if url not in self.pages:
+            return FetchResult(url, status_code=404, error='Not found')
+        return FetchResult(url, self.pages[url], status_code=200)
+
+
+class TestStateItemsParser(TestCase):
+    ITEM = {
+        'cellTrackingInfo': {'title': 'Книга', 'finalPrice': 1299},
+        'action': {'link': '/context/detail/id/1/?asb=1'},
+        'tileImage': {'items': [{'image': {'link': 'https://img/1.jpg'}}]}
+    }
+
+    @staticmethod
+    def get_page(items, total_pages=None):
+        page = '<div id="state-searchResultsV2-1" data-state=\'{}\'></div>'\
+            .format(json.dumps({'items': items}))
+        if total_pages is not None:
+            page += '<div id="state-paginator-2" data-state=\'{}\'></div>'\
+                .format(json.dumps({'totalPages': total_pages}))
+        return page
+
+    def test_parse(self):
+        '''Ensure items are found by any known path and incomplete
+        ones are skipped.
+        '''
+        parser = StateItemsParser.__new__(StateItemsParser)
+        page = self.get_page([
+            self.ITEM,
+            {'mainState': [
+                {'id': 'name', 'atom': {'textAtom': {'text': 'Ручка'}}},
+                {'id': 'price', 'atom': {'price': {'price': '1 050 ₽'}}}
+            ], 'link': '/context/detail/id/2/', 'images': ['img/2.jpg']},
+            {'title': 'No url'}
+        ], total_pages=3)
+
+        self.assertEqual(parser.parse(page), {'items': [
+            {'external_url': '/context/detail/id/1/',
+             'image_url': 'https://img/1.jpg', 'name': 'Книга',
+             'price': 1299},
+            {'external_url': '/context/detail/id/2/',
+             'image_url': 'img/2.jpg', 'name': 'Ручка', 'price': 1050},
+        ], 'max_page': 3})
+        self.assertIsNone(parser.parse('<div id="other"></div>'))
+
+    def test_iter_items_with_fallback(self):
+        '''Ensure every page is fetched and page without state
+        is given to fallback.
+        '''
+        url = '/category/a/'
+        parser = FakeStateItemsParser({
+            url: self.get_page([self.ITEM], total_pages=3),
+            url + '?page=2': '<html></html>',
+            url + '?page=3': self.get_page([self.ITEM], total_pages=3),
+        })
+        fallback_urls = []
+
+        def fallback(page_url):
+            fallback_urls.append(page_url)
+            return [{'name': 'From browser'}]
+
+        try:
+            pages = list(parser.runtime.iterate(
+                parser.iter_items(url, fallback)))
+        finally:
+            parser.runtime.close()
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(fallback_urls, [url + '?page=2'])
+
+
+class FakeLogDriver:
+
+    def __init__(self, events):
+        self.events = events
+
+    def get_log(self, log_type):
+        return [{'message': json.dumps({'message': {
+            'method': method, 'params': params}})}
+            for method, params in self.events]
+
+
+class TestBrowserProfile(TestCase):
+
+    def test_blocking_rules(self):
+        profile = BrowserProfile(block_images=False,
+                                 allowed_domains=['ozon.ru'])
+
+        self.assertEqual(profile.get_prefs(), {})
+        self.assertIn('*.woff2*', profile.get_blocked_urls())
+        self.assertNotIn('*.jpg*', profile.get_blocked_urls())
+        self.assertEqual(profile.get_host_resolver_rules(),
+                         'MAP * ~NOTFOUND, EXCLUDE ozon.ru, EXCLUDE *.ozon.ru')
+
+        full_profile = BrowserProfile.get_full_profile()
+        self.assertEqual(full_profile.get_blocked_urls(), [])
+        self.assertIsNone(full_profile.get_host_resolver_rules())
+
+    def test_read_traffic(self):
+        driver = FakeLogDriver([
+            ('Network.requestWillBeSent', {}),
+            ('Network.requestWillBeSent', {}),
+            ('Network.requestWillBeSent', {}),
+            ('Network.loadingFinished', {'encodedDataLength': 1000}),
+            ('Network.loadingFailed', {'blockedReason': 'inspector'}),
+            ('Network.loadingFailed',
+             {'errorText': 'net::ERR_NAME_NOT_RESOLVED'}),
+            ('Page.loadEventFired', {}),
+        ])
+
+        self.assertEqual(BrowserProfile().read_traffic(driver),
+                         PageTraffic(requests=3, blocked=2, bytes=1000))
+
+
+class FakeCachingBrowser:
+    """Save downloaded asset and lock file to user data directory.
+    """
+
+    def __init__(self, user_data_dir):
+        self.user_data_dir = user_data_dir
+
+    def get(self, url):
+        for name in ['asset.js', 'SingletonLock']:
+            with open(os.path.join(self.user_data_dir, name), 'w') as f:
+                f.write(url)
+
+    def quit(self):
+        pass
+
+
+class FakeCachingChrome(FakeCachingBrowser):
+    """Started like Chrome, with user data directory in its options.
+    """
+
+    def __init__(self, desired_capabilities, **kwargs):
+        prefix = '--user-data-dir='
+        super().__init__(next(
+            argument[len(prefix):]
+            for argument in desired_capabilities['goog:chromeOptions']['args']
+            if argument.startswith(prefix)
+        ))
+
+    def execute_cdp_cmd(self, cmd, params):
+        pass
+
+
+class TestWarmProfileCache(TestCase):
+
+    @patch('selenium.webdriver.Chrome', FakeCachingChrome)
+    def test_browser_warms_up_cache(self):
+        '''Ensure the first browser warms up cache before cloning it
+        and its clone is removed when browser quits.
+        '''
+        with TemporaryDirectory() as directory:
+            cache = WarmProfileCache(directory, warm_up_urls=['main'])
+            parser = ItemsParser(workers=1, warm_cache=cache)
+
+            with parser.driver_pool.lease() as browser:
+                self.assertTrue(cache.is_warm)
+                self.assertEqual(
+                    os.listdir(browser.user_data_dir), ['asset.js'])
+            parser.close()
+
+            self.assertFalse(os.path.exists(browser.user_data_dir))
+
+    def test_warm_up_and_clone(self):
+        '''Ensure clones get warmed up files except lock files and
+        are removed on close.
+        '''
+        with TemporaryDirectory() as directory:
+            cache = WarmProfileCache(directory, warm_up_urls=['main'])
+            cache.warm_up(FakeCachingBrowser)
+
+            first, second = cache.clone(), cache.clone()
+
+            self.assertTrue(cache.is_warm)
+            self.assertNotEqual(first, second)
+            self.assertEqual(os.listdir(first), ['asset.js'])
+            cache.remove(first)
+            self.assertFalse(os.path.exists(first))
+            cache.close()
+            self.assertFalse(os.path.exists(second))
+
+
+class TestParser(TestCase):
+
+    def test_create_parser(self):
+        '''Ensure parser is created with settings of its parsers.
+        '''
+        with TemporaryDirectory() as directory:
+            with Parser(items_engine='state', warm_cache_dir=directory,
+                        block_resources=False) as parser:
+                self.assertIs(parser.items_parser.warm_cache,
+                              parser.warm_cache)
+                self.assertFalse(parser.items_parser.profile.block_images)
+
+        with Parser() as parser:
+            self.assertIsNone(parser.items_parser.warm_cache)
+            self.assertTrue(parser.items_parser.profile.block_images)